@@ -0,0 +1,77 @@
+"""Compares the vectorized rasterizers (draw_segments, draw_segments_coverage) with the pixel by pixel draw_line path.
+
+Run it inside Blender, from the repository root:
+
+    blender -b --python benchmarks/bench_raster.py -- --res 1024 --segments 20000
+
+or with a plain Python, using the stand-in modules of benchmarks/standin:
+
+    python benchmarks/bench_raster.py --res 1024 --segments 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+try:
+    import bpy  # noqa: F401
+except ImportError:
+    sys.path.insert(0, os.path.join(HERE, 'standin'))
+
+import spiderwebs  # noqa: E402
+
+
+def random_segments(number, max_length, seed=0):
+    rng = np.random.RandomState(seed)
+    start = rng.rand(number, 2)
+    end = np.clip(start + (rng.rand(number, 2) - .5) * 2 * max_length, 0, 1)
+    return np.stack((start, end), axis=1)
+
+
+def legacy_raster(pixels, segments, res, res_x, offset=0):
+    for (x0, y0), (x1, y1) in segments:
+        spiderwebs.draw_line(pixels, int(x0 * res) + offset, int(y0 * res), int(x1 * res) + offset, int(y1 * res), .1, res, res_x)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--res", type=int, default=1024)
+    parser.add_argument("--planes", type=int, default=2)
+    parser.add_argument("--segments", type=int, default=20000, help="segments per plane")
+    parser.add_argument("--max-length", type=float, default=.05, help="in uv units")
+    parser.add_argument("--width", type=float, default=1., help="strand width of the coverage rasterizer, in pixels")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args(argv)
+
+    res, res_x = args.res, args.res * args.planes
+    planes = [random_segments(args.segments, args.max_length, seed) for seed in range(args.planes)]
+
+    pixels = np.zeros(res * res_x)
+    start = time.time()
+    for i, segments in enumerate(planes):
+        spiderwebs.draw_segments(pixels, segments, res, res_x, offset=i * res)
+    vectorized = time.time() - start
+    print("draw_segments: %.3fs" % vectorized)
+
+    coverage = np.zeros(res * res_x, dtype=np.float32)
+    start = time.time()
+    for i, segments in enumerate(planes):
+        spiderwebs.draw_segments_coverage(coverage, segments, args.width, res, res_x, offset=i * res)
+    print("draw_segments_coverage: %.3fs (width %g px)" % (time.time() - start, args.width))
+
+    if not args.skip_legacy:
+        reference = np.zeros(res * res_x)
+        start = time.time()
+        for i, segments in enumerate(planes):
+            legacy_raster(reference, segments, res, res_x, offset=i * res)
+        legacy = time.time() - start
+        print("draw_line:     %.3fs (x%.1f)" % (legacy, legacy / max(vectorized, 1e-9)))
+        print("max difference: %g" % np.abs(reference - pixels).max())
+
+
+if __name__ == "__main__":
+    main(sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:])
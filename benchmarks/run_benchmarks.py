@@ -0,0 +1,186 @@
+"""Times the web generation and rasterization stages on synthetic grease pencil scenes.
+
+Runs inside Blender:
+
+    blender -b --python benchmarks/run_benchmarks.py -- --output results.json
+
+or with a plain Python that has NumPy, in which case the stand-in modules of
+benchmarks/standin replace mathutils, bpy and bmesh. Their pure Python
+mathutils is much slower than Blender's, so only compare results produced
+in the same environment:
+
+    python benchmarks/run_benchmarks.py --density 1 2 --number 1 10 --output before.json
+    python benchmarks/run_benchmarks.py --density 1 2 --number 1 10 --compare before.json
+"""
+import argparse
+import collections
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+try:
+    import bpy
+    STANDIN = False
+except ImportError:
+    sys.path.insert(0, os.path.join(HERE, 'standin'))
+    import bpy
+    STANDIN = True
+
+import numpy as np  # noqa: E402
+
+import spiderwebs  # noqa: E402
+import synthetic  # noqa: E402
+
+PARAMETERS = ('scene', 'points', 'density', 'size', 'number', 'texture_size')
+
+
+@contextlib.contextmanager
+def timer(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+def legacy_raster(segments, res):
+    pixels = np.zeros(res * res)
+    for (x0, y0), (x1, y1) in segments:
+        spiderwebs.draw_line(pixels, int(x0 * res), int(y0 * res), int(x1 * res), int(y1 * res), .1, res, res)
+    return pixels
+
+
+def run_case(case, seed, legacy, trace=None):
+    if STANDIN:
+        bpy.reset()
+    # every case and repeat starts cold, nothing memoized by a previous one is reused
+    spiderwebs.geometry_cache.clear()
+    spiderwebs._geometry_frame = None
+    synthetic.set_grease_points(synthetic.make_scene(case['scene'], case['points'], seed))
+    size, number, res = case['size'], case['number'], case['texture_size']
+    timings = collections.OrderedDict()
+    result = dict(case, timings=timings)
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    with timer(timings, 'get_grease_points'):
+        grease_points = spiderwebs.get_grease_points()
+
+    rng = spiderwebs.make_rng(seed)
+    with timer(timings, 'setup_anchors'):
+        for i in range(number):
+            spiderwebs.setup_anchors(list(grease_points), size, size * 2, rng=rng)
+
+    with timer(timings, 'generate_webs'), quiet:
+        webs = spiderwebs.Webs(size=size, webs_number=number, gravity_strength=1, density=case['density'], seed=seed)
+    result['verts'] = len(webs.verts)
+    result['edges'] = len(webs.edges)
+    result['threads'] = len(webs.threads_vects)
+    result['verts_per_second'] = result['verts'] / max(timings['generate_webs'], 1e-9)
+    result['edges_per_second'] = result['edges'] / max(timings['generate_webs'], 1e-9)
+    result['counters'] = dict(webs.clock.counters)
+    result['scopes'] = {name: duration for name, (calls, duration) in webs.clock.totals().items()}
+
+    segments = [spiderwebs.points_to_uv_coords(web.get_edges_coords().reshape(-1, 3), web.plane_normal)[0].reshape(-1, 2, 2)
+                for web in webs.webs if len(web.anchor_points) > 2]
+    segments = np.concatenate(segments) if segments else np.zeros((0, 2, 2))
+    result['segments'] = len(segments)
+    with timer(timings, 'rasterize'):
+        spiderwebs.draw_segments(np.zeros(res * res), segments, res)
+    if legacy:
+        with timer(timings, 'rasterize_legacy'):
+            legacy_raster(segments, res)
+
+    for stage, draw in (('draw_curve', webs.draw_curve), ('draw_3d', webs.draw_3d), ('draw_2d', lambda: webs.draw_2d(res))):
+        try:
+            with timer(timings, stage), quiet:
+                draw()
+        except Exception as error:
+            result.setdefault('errors', {})[stage] = repr(error)
+    if trace:
+        webs.clock.save_chrome_trace(trace)
+    return result
+
+
+def best_of(results):
+    "Keeps the fastest timing of each stage over the repeats"
+    best = dict(results[0], timings=collections.OrderedDict())
+    for stage in results[0]['timings']:
+        best['timings'][stage] = min(r['timings'][stage] for r in results)
+    best['verts_per_second'] = best['verts'] / max(best['timings']['generate_webs'], 1e-9)
+    best['edges_per_second'] = best['edges'] / max(best['timings']['generate_webs'], 1e-9)
+    return best
+
+
+def case_key(result):
+    return tuple(result[i] for i in PARAMETERS)
+
+
+def print_result(result, reference=None):
+    print(", ".join("%s=%s" % (i, result[i]) for i in PARAMETERS),
+          "| %d verts, %d edges, %d segments, %.0f verts/s" % (result['verts'], result['edges'], result['segments'], result['verts_per_second']))
+    for stage, duration in result['timings'].items():
+        line = "    %-18s %9.4fs" % (stage, duration)
+        if reference is not None and stage in reference['timings']:
+            line += "   was %9.4fs  x%.2f" % (reference['timings'][stage], reference['timings'][stage] / max(duration, 1e-9))
+        print(line)
+    for stage, error in result.get('errors', {}).items():
+        print("    %-18s failed: %s" % (stage, error))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scene', nargs='+', default=sorted(synthetic.SCENES), choices=sorted(synthetic.SCENES))
+    parser.add_argument('--points', nargs='+', type=int, default=[600], help="grease pencil points per scene")
+    parser.add_argument('--density', nargs='+', type=float, default=[1., 2.])
+    parser.add_argument('--size', nargs='+', type=float, default=[1.])
+    parser.add_argument('--number', nargs='+', type=int, default=[1, 5])
+    parser.add_argument('--texture-size', nargs='+', type=int, default=[1024])
+    parser.add_argument('--repeat', type=int, default=1, help="keeps the best timing of this many runs")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--legacy-raster', action='store_true', help="also times the pixel by pixel draw_line path")
+    parser.add_argument('--output', help="json file the results are written to")
+    parser.add_argument('--compare', help="json file of a previous run to compare with")
+    parser.add_argument('--trace', help="folder where a chrome://tracing file is written for every case")
+    args = parser.parse_args(argv)
+
+    reference = {}
+    if args.compare:
+        with open(args.compare) as f:
+            reference = {case_key(r): r for r in json.load(f, object_pairs_hook=collections.OrderedDict)['results']}
+
+    results = []
+    for values in itertools.product(args.scene, args.points, args.density, args.size, args.number, args.texture_size):
+        case = dict(zip(PARAMETERS, values))
+        trace = None
+        if args.trace:
+            os.makedirs(args.trace, exist_ok=True)
+            trace = os.path.join(args.trace, "_".join(str(case[i]) for i in PARAMETERS) + ".json")
+        result = best_of([run_case(case, args.seed, args.legacy_raster, trace) for i in range(args.repeat)])
+        print_result(result, reference.get(case_key(result)))
+        results.append(result)
+
+    if args.output:
+        meta = {
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'blender': None if STANDIN else '.'.join(str(i) for i in bpy.app.version),
+            'standin': STANDIN,
+            'seed': args.seed,
+            'repeat': args.repeat,
+        }
+        with open(args.output, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=1)
+        print("results written to", args.output)
+
+
+if __name__ == '__main__':
+    main(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:])
@@ -0,0 +1,121 @@
+"""Headless stand-in for the parts of Blender 2.79's bmesh used by spiderwebs."""
+import numpy as np
+
+from . import ops  # noqa: F401
+
+__all__ = ("new", "ops")
+
+
+class BMVert:
+    def __init__(self, co):
+        from mathutils import Vector
+        self.co = Vector(co)
+        self.index = -1
+        self.link_faces = []
+
+
+class BMLoop:
+    def __init__(self, vert, face):
+        self.vert = vert
+        self.face = face
+        self._layers = {}
+
+    def __getitem__(self, layer):
+        if layer not in self._layers:
+            from mathutils import Vector
+            self._layers[layer] = _UV(Vector((0.0, 0.0)))
+        return self._layers[layer]
+
+
+class _UV:
+    def __init__(self, uv):
+        self.uv = uv
+
+
+class BMFace:
+    def __init__(self, verts):
+        self.verts = list(verts)
+        self.loops = [BMLoop(v, self) for v in self.verts]
+        self.smooth = False
+        self.material_index = 0
+        self.index = -1
+        for v in self.verts:
+            v.link_faces.append(self)
+
+
+class _Layer:
+    def __init__(self, name):
+        self.name = name
+
+
+class _LayerCollection(dict):
+    def verify(self):
+        if 'default' not in self:
+            self['default'] = _Layer('default')
+        return self['default']
+
+    def new(self, name='default'):
+        self[name] = _Layer(name)
+        return self[name]
+
+
+class _Layers:
+    def __init__(self):
+        self.uv = _LayerCollection()
+        self.tex = _LayerCollection()
+
+
+class _Sequence(list):
+    def __init__(self, factory):
+        super().__init__()
+        self._factory = factory
+        self.layers = _Layers()
+
+    def new(self, *args):
+        item = self._factory(*args)
+        self.append(item)
+        return item
+
+    def ensure_lookup_table(self):
+        pass
+
+    def index_update(self):
+        for i, item in enumerate(self):
+            item.index = i
+
+    def remove(self, item):
+        list.remove(self, item)
+
+
+class BMesh:
+    def __init__(self):
+        self.verts = _Sequence(BMVert)
+        self.faces = _Sequence(self._new_face)
+        self.loops = _Sequence(None)
+        self.edges = _Sequence(None)
+
+    def _new_face(self, verts):
+        verts = list(verts)
+        if len(verts) < 3:
+            raise ValueError("faces.new(verts): sequence too short (%d)" % len(verts))
+        if len({id(v) for v in verts}) != len(verts):
+            raise ValueError("faces.new(verts): found the same (BMVert) used multiple times")
+        return BMFace(verts)
+
+    def normal_update(self):
+        pass
+
+    def free(self):
+        pass
+
+    def to_mesh(self, mesh):
+        self.verts.index_update()
+        mesh.vertices.add(len(self.verts))
+        mesh.vertices.foreach_set('co', np.array([tuple(v.co) for v in self.verts], dtype=np.float32).reshape(-1))
+        mesh.polygons = [[v.index for v in f.verts] for f in self.faces]
+        mesh.uv_layers = [[tuple(l[layer].uv) for f in self.faces for l in f.loops]
+                          for layer in self.loops.layers.uv.values()]
+
+
+def new():
+    return BMesh()
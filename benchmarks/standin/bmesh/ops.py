@@ -0,0 +1,56 @@
+"""Stand-in for the bmesh.ops used by spiderwebs."""
+
+
+def triangulate(bm, faces, quad_method=0, ngon_method=0):
+    """Fan triangulation, keeps UVs of the original corners."""
+    new_faces = []
+    for face in list(faces):
+        if len(face.verts) == 3:
+            new_faces.append(face)
+            continue
+        bm.faces.remove(face)
+        first = face.loops[0]
+        for a, b in zip(face.loops[1:-1], face.loops[2:]):
+            tri = bm.faces.new((first.vert, a.vert, b.vert))
+            tri.smooth = face.smooth
+            for loop, source in zip(tri.loops, (first, a, b)):
+                for layer, value in source._layers.items():
+                    loop[layer].uv = value.uv.copy()
+            new_faces.append(tri)
+    return {'faces': new_faces}
+
+
+def subdivide_edges(bm, edges=(), cuts=1, smooth=0.0, use_grid_fill=False, **kwargs):
+    """Only splits every triangle into (cuts + 1)^2 triangles, good enough to time the call."""
+    from mathutils import Vector
+    n = cuts + 1
+    for face in [f for f in bm.faces if len(f.verts) == 3]:
+        bm.faces.remove(face)
+        corners = [l.vert.co for l in face.loops]
+        layers = list(face.loops[0]._layers)
+        uvs = {layer: [l[layer].uv for l in face.loops] for layer in layers}
+        grid = {}
+
+        def vert(i, j):
+            if (i, j) not in grid:
+                a, b = i / n, j / n
+                grid[i, j] = bm.verts.new(corners[0] * (1 - a - b) + corners[1] * a + corners[2] * b)
+            return grid[i, j]
+
+        def uv(layer, i, j):
+            a, b = i / n, j / n
+            c = uvs[layer]
+            return c[0] * (1 - a - b) + c[1] * a + c[2] * b
+
+        for i in range(n):
+            for j in range(n - i):
+                tris = [((i, j), (i + 1, j), (i, j + 1))]
+                if i + j < n - 1:
+                    tris.append(((i + 1, j), (i + 1, j + 1), (i, j + 1)))
+                for tri in tris:
+                    new = bm.faces.new([vert(*k) for k in tri])
+                    new.smooth = face.smooth
+                    for loop, k in zip(new.loops, tri):
+                        for layer in layers:
+                            loop[layer].uv = uv(layer, *k)
+    return {}
@@ -0,0 +1,408 @@
+"""Headless stand-in for the parts of Blender 2.79's bpy used by spiderwebs.
+
+Datablocks only keep their data in NumPy arrays so that the benchmarks can
+time the Python side of mesh, curve and image creation and check the
+results; nothing is drawn.
+"""
+import numpy as np
+
+from . import types, props, utils, ops  # noqa: F401
+
+__all__ = ("context", "data", "types", "props", "utils", "ops")
+
+
+class _Collection(list):
+    """Named ID collection (bpy.data.meshes, bpy.data.images...)."""
+
+    def __init__(self, factory=None):
+        super().__init__()
+        self._factory = factory
+
+    def new(self, name, *args, **kwargs):
+        datablock = self._factory(self._unique(name), *args, **kwargs)
+        self.append(datablock)
+        return datablock
+
+    def _unique(self, name):
+        names = {i.name for i in self}
+        if name not in names:
+            return name
+        k = 1
+        while "%s.%03d" % (name, k) in names:
+            k += 1
+        return "%s.%03d" % (name, k)
+
+    def get(self, name, default=None):
+        for item in self:
+            if item.name == name:
+                return item
+        return default
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            item = self.get(key)
+            if item is None:
+                raise KeyError(key)
+            return item
+        return list.__getitem__(self, key)
+
+    def remove(self, datablock, do_unlink=True):
+        list.remove(self, datablock)
+
+
+class _ID:
+    def __init__(self, name):
+        self.name = name
+        self.users = 0
+        self.use_fake_user = False
+
+    def user_clear(self):
+        self.users = 0
+
+
+class _ArrayCollection:
+    """Vertices/edges/points collection backed by one NumPy array per attribute."""
+
+    def __init__(self, fields, initial=0):
+        self._fields = fields
+        self._arrays = {name: np.zeros((initial, width), dtype=dtype) for name, (width, dtype) in fields.items()}
+
+    def __len__(self):
+        return len(next(iter(self._arrays.values())))
+
+    def add(self, count):
+        count = max(0, count)  # RNA clamps int arguments to their range
+        for name, (width, dtype) in self._fields.items():
+            array = self._arrays[name]
+            extra = np.zeros((count, width), dtype=dtype)
+            if name == 'co' and width == 4:
+                extra[:, 3] = 1
+            self._arrays[name] = np.concatenate((array, extra))
+
+    def foreach_set(self, attr, seq):
+        array = self._arrays[attr]
+        values = np.asarray(seq, dtype=array.dtype).reshape(-1)
+        if values.size != array.size:
+            raise RuntimeError("foreach_set(): size mismatch %d != %d" % (values.size, array.size))
+        array[:] = values.reshape(array.shape)
+
+    def foreach_get(self, attr, seq):
+        array = self._arrays[attr]
+        seq[:] = array.reshape(-1)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return _Element(self, index)
+
+    def __iter__(self):
+        return (_Element(self, i) for i in range(len(self)))
+
+    def values(self):
+        return list(self)
+
+
+class _Element:
+    def __init__(self, collection, index):
+        object.__setattr__(self, '_collection', collection)
+        object.__setattr__(self, '_index', index)
+
+    def __getattr__(self, attr):
+        arrays = self._collection._arrays
+        if attr not in arrays:
+            raise AttributeError(attr)
+        value = arrays[attr][self._index]
+        if attr == 'co' and len(value) == 3:
+            from mathutils import Vector
+            return Vector(value)
+        return tuple(value)
+
+    def __setattr__(self, attr, value):
+        self._collection._arrays[attr][self._index] = value
+
+
+class Mesh(_ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.vertices = _ArrayCollection({'co': (3, np.float32)})
+        self.edges = _ArrayCollection({'vertices': (2, np.int32)})
+        self.polygons = []
+        self.uv_layers = []
+        self.materials = []
+
+    def from_pydata(self, vertices, edges, faces):
+        vertices = [tuple(v) for v in vertices]
+        edges = [tuple(e) for e in edges]
+        self.vertices.add(len(vertices))
+        self.vertices.foreach_set('co', [c for v in vertices for c in v])
+        self.edges.add(len(edges))
+        self.edges.foreach_set('vertices', [i for e in edges for i in e])
+        self.polygons = [list(f) for f in faces]
+
+    def update(self, *args, **kwargs):
+        pass
+
+    def validate(self, *args, **kwargs):
+        return False
+
+
+class _Spline:
+    def __init__(self, spline_type):
+        self.type = spline_type
+        self.points = _ArrayCollection({'co': (4, np.float32)}, initial=0)
+        self.points.add(1)
+        self.use_smooth = True
+
+
+class _Splines(list):
+    def new(self, spline_type):
+        spline = _Spline(spline_type)
+        self.append(spline)
+        return spline
+
+
+class Curve(_ID):
+    def __init__(self, name, type='CURVE'):
+        super().__init__(name)
+        self.type = type
+        self.splines = _Splines()
+        self.dimensions = '2D'
+        self.bevel_depth = 0.0
+        self.bevel_resolution = 0
+        self.fill_mode = 'HALF'
+
+
+class _Pixels:
+    def __init__(self, size):
+        self._array = np.zeros(size, dtype=np.float32)
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, index):
+        return self._array[index]
+
+    def __setitem__(self, index, values):
+        self._array[index] = values
+
+    def foreach_set(self, seq):
+        values = np.asarray(seq, dtype=np.float32).reshape(-1)
+        if values.size != self._array.size:
+            raise RuntimeError("foreach_set(): size mismatch %d != %d" % (values.size, self._array.size))
+        self._array[:] = values
+
+    def foreach_get(self, seq):
+        seq[:] = self._array
+
+
+class Image(_ID):
+    def __init__(self, name, width, height, alpha=False, float_buffer=False):
+        super().__init__(name)
+        self.size = (width, height)
+        self.alpha_mode = 'STRAIGHT'
+        self.use_alpha = alpha
+        self.is_float = float_buffer
+        self.filepath_raw = ""
+        self.filepath = ""
+        self.file_format = 'PNG'
+        self._pixels = _Pixels(width * height * 4)
+
+    @property
+    def pixels(self):
+        return self._pixels
+
+    @pixels.setter
+    def pixels(self, values):
+        values = np.asarray([float(i) for i in values] if not hasattr(values, 'dtype') else values,
+                            dtype=np.float32).reshape(-1)
+        if values.size != len(self._pixels):
+            raise ValueError("pixels: size mismatch")
+        self._pixels._array[:] = values
+
+    def save(self):
+        pass
+
+    def update(self):
+        pass
+
+    def pack(self, as_png=False):
+        pass
+
+    def reload(self):
+        pass
+
+
+class _Images(_Collection):
+    def __init__(self):
+        super().__init__(Image)
+
+    def load(self, filepath, check_existing=False):
+        import os
+        image = self.new(os.path.basename(filepath), 1, 1)
+        image.filepath = filepath
+        return image
+
+
+class _Modifiers(list):
+    def new(self, name, type):
+        modifier = _Bag(name=name, type=type, settings=_Bag())
+        self.append(modifier)
+        return modifier
+
+
+class _VertexGroups(list):
+    def new(self, name):
+        group = _Bag(name=name, add=lambda *args: None)
+        self.append(group)
+        return group
+
+
+class _Bag:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Object(_ID):
+    def __init__(self, name, object_data):
+        super().__init__(name)
+        self.data = object_data
+        self.select = False
+        self.active_material = None
+        self.modifiers = _Modifiers()
+        self.vertex_groups = _VertexGroups()
+        self.type = 'MESH' if isinstance(object_data, Mesh) else 'CURVE' if isinstance(object_data, Curve) else 'EMPTY'
+        from mathutils import Matrix
+        self.matrix_world = Matrix.Identity(4)
+
+
+class GPencilStroke:
+    def __init__(self):
+        self.points = _ArrayCollection({'co': (3, np.float32), 'pressure': (1, np.float32)})
+        self.draw_mode = '3DSPACE'
+
+
+class _Strokes(list):
+    def new(self, colorname=""):
+        stroke = GPencilStroke()
+        self.append(stroke)
+        return stroke
+
+
+class GPencilFrame:
+    def __init__(self, frame_number):
+        self.frame_number = frame_number
+        self.strokes = _Strokes()
+
+
+class _Frames(list):
+    def new(self, frame_number, active=False):
+        frame = GPencilFrame(frame_number)
+        self.append(frame)
+        return frame
+
+
+class GPencilLayer:
+    def __init__(self, info):
+        self.info = info
+        self.frames = _Frames()
+
+    @property
+    def active_frame(self):
+        # the frame shown at the current scene frame
+        current = context.scene.frame_current
+        frames = [f for f in self.frames if f.frame_number <= current]
+        if not frames:
+            return None
+        return max(frames, key=lambda f: f.frame_number)
+
+
+class _Layers(list):
+    def __init__(self):
+        super().__init__()
+        self.active = None
+
+    def new(self, info, set_active=False):
+        layer = GPencilLayer(info)
+        self.append(layer)
+        if set_active or self.active is None:
+            self.active = layer
+        return layer
+
+
+class GreasePencil(_ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.layers = _Layers()
+
+
+class _Libraries(list):
+    def write(self, filepath, datablocks, relative_remap=False, fake_user=False, compress=False):
+        self.last_write = (filepath, set(datablocks))
+
+
+class _Data:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.meshes = _Collection(Mesh)
+        self.curves = _Collection(Curve)
+        self.objects = _Collection(Object)
+        self.images = _Images()
+        self.materials = _Collection(lambda name: _ID(name))
+        self.grease_pencil = _Collection(GreasePencil)
+        self.libraries = _Libraries()
+        self.filepath = ""
+
+
+class _SceneObjects(list):
+    def __init__(self):
+        super().__init__()
+        self.active = None
+
+    def link(self, obj):
+        obj.users += 1
+        self.append(obj)
+
+    def unlink(self, obj):
+        self.remove(obj)
+
+
+class Scene:
+    def __init__(self):
+        self.objects = _SceneObjects()
+        self.grease_pencil = None
+        self.frame_current = 1
+
+    def update(self):
+        pass
+
+
+class _Context:
+    def __init__(self):
+        self.scene = Scene()
+
+    @property
+    def selected_objects(self):
+        return [o for o in self.scene.objects if o.select]
+
+    @property
+    def object(self):
+        return self.scene.objects.active
+
+    @property
+    def active_object(self):
+        return self.scene.objects.active
+
+
+data = _Data()
+context = _Context()
+app = _Bag(version=(2, 79, 0), background=True)
+
+
+def reset():
+    """Forget every datablock and start from an empty scene."""
+    data.reset()
+    context.scene = Scene()
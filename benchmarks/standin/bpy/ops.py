@@ -0,0 +1,16 @@
+"""Stand-in for bpy.ops: every operator is accepted and does nothing."""
+
+
+class _Operator:
+    def __init__(self, path):
+        self._path = path
+
+    def __getattr__(self, name):
+        return _Operator(self._path + (name,))
+
+    def __call__(self, *args, **kwargs):
+        return {'FINISHED'}
+
+
+def __getattr__(name):
+    return _Operator((name,))
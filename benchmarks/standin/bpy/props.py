@@ -0,0 +1,14 @@
+"""Stand-in for bpy.props: a property declaration simply evaluates to its default."""
+
+
+def _property(default):
+    def declare(**kwargs):
+        return kwargs.get('default', default)
+    return declare
+
+
+BoolProperty = _property(False)
+IntProperty = _property(0)
+FloatProperty = _property(0.0)
+StringProperty = _property("")
+EnumProperty = _property(None)
@@ -0,0 +1,25 @@
+"""Stand-in for bpy.types."""
+
+
+class Operator:
+    bl_idname = ""
+    bl_label = ""
+    bl_options = set()
+
+    def report(self, level, message):
+        print(", ".join(sorted(level)), message)
+
+
+class _Panel:
+    def __init__(self):
+        self.draw_funcs = []
+
+    def append(self, func):
+        self.draw_funcs.append(func)
+
+    def remove(self, func):
+        self.draw_funcs.remove(func)
+
+
+VIEW3D_PT_tools_object = _Panel()
+INFO_MT_mesh_add = _Panel()
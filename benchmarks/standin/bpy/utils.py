@@ -0,0 +1,11 @@
+"""Stand-in for bpy.utils."""
+
+registered = []
+
+
+def register_class(cls):
+    registered.append(cls)
+
+
+def unregister_class(cls):
+    registered.remove(cls)
@@ -0,0 +1,344 @@
+"""Pure Python stand-in for the parts of Blender 2.79's mathutils used by spiderwebs.
+
+Semantics follow the 2.79 API (``*`` is the matrix / dot product operator),
+the speed obviously does not: absolute timings are only comparable between
+runs made with the same stand-in.
+"""
+from math import sqrt, acos, cos, sin, pi
+from numbers import Number
+
+from . import geometry, kdtree  # noqa: F401
+
+__all__ = ("Vector", "Matrix", "Quaternion", "geometry", "kdtree")
+
+
+def _is_seq(value):
+    return isinstance(value, (Vector, tuple, list))
+
+
+class Vector:
+    __slots__ = ("_data",)
+
+    def __init__(self, seq=(0.0, 0.0, 0.0)):
+        self._data = [float(i) for i in seq]
+        if not 2 <= len(self._data) <= 4:
+            raise ValueError("Vector(): invalid size %d" % len(self._data))
+
+    # sequence protocol
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._data[index])
+        return self._data[index]
+
+    def __setitem__(self, index, value):
+        self._data[index] = float(value)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __repr__(self):
+        return "Vector((%s))" % ", ".join("%.4f" % i for i in self._data)
+
+    def __eq__(self, other):
+        if _is_seq(other):
+            return len(other) == len(self) and all(a == b for a, b in zip(self._data, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    # component access
+    def _get(index):
+        return property(lambda self: self._data[index],
+                        lambda self, value: self._data.__setitem__(index, float(value)))
+
+    x = _get(0)
+    y = _get(1)
+    z = _get(2)
+    w = _get(3)
+    del _get
+
+    # arithmetic
+    def __add__(self, other):
+        if not _is_seq(other) or len(other) != len(self):
+            return NotImplemented
+        return Vector([a + b for a, b in zip(self._data, other)])
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if not _is_seq(other) or len(other) != len(self):
+            return NotImplemented
+        return Vector([a - b for a, b in zip(self._data, other)])
+
+    def __rsub__(self, other):
+        if not _is_seq(other) or len(other) != len(self):
+            return NotImplemented
+        return Vector([b - a for a, b in zip(self._data, other)])
+
+    def __neg__(self):
+        return Vector([-a for a in self._data])
+
+    def __mul__(self, other):
+        if isinstance(other, Number):
+            return Vector([a * other for a in self._data])
+        if isinstance(other, Vector):
+            return self.dot(other)
+        if isinstance(other, Matrix):
+            # row vector times matrix
+            return Vector([sum(self._data[i] * other._rows[i][j] for i in range(len(self)))
+                           for j in range(other._ncols)])
+        return NotImplemented
+
+    def __rmul__(self, other):
+        if isinstance(other, Number):
+            return Vector([a * other for a in self._data])
+        return NotImplemented
+
+    def __truediv__(self, other):
+        if not isinstance(other, Number):
+            return NotImplemented
+        if other == 0:
+            raise ZeroDivisionError("Vector division: divide by zero error")
+        return Vector([a / other for a in self._data])
+
+    def __iadd__(self, other):
+        result = self.__add__(other)
+        if result is NotImplemented:
+            return result
+        self._data = result._data
+        return self
+
+    def __isub__(self, other):
+        result = self.__sub__(other)
+        if result is NotImplemented:
+            return result
+        self._data = result._data
+        return self
+
+    def __imul__(self, other):
+        if not isinstance(other, Number):
+            return NotImplemented
+        self._data = [a * other for a in self._data]
+        return self
+
+    def __itruediv__(self, other):
+        result = self.__truediv__(other)
+        if result is NotImplemented:
+            return result
+        self._data = result._data
+        return self
+
+    # methods
+    @property
+    def length(self):
+        return sqrt(sum(a * a for a in self._data))
+
+    @property
+    def length_squared(self):
+        return sum(a * a for a in self._data)
+
+    def copy(self):
+        return Vector(self._data)
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self._data, other))
+
+    def cross(self, other):
+        a, b = self._data, list(other)
+        if len(a) == 2:
+            return a[0] * b[1] - a[1] * b[0]
+        return Vector((a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]))
+
+    def normalize(self):
+        length = self.length
+        if length != 0:
+            self._data = [a / length for a in self._data]
+
+    def normalized(self):
+        vector = self.copy()
+        vector.normalize()
+        return vector
+
+    def angle(self, other, fallback=None):
+        len_a, len_b = self.length, Vector(other).length
+        if len_a == 0 or len_b == 0:
+            if fallback is not None:
+                return fallback
+            raise ValueError("Vector.angle(other): zero length vectors have no valid angle")
+        dot = self.dot(other) / (len_a * len_b)
+        return acos(max(-1.0, min(1.0, dot)))
+
+    def resize_2d(self):
+        self._data = (self._data + [0.0, 0.0])[:2]
+
+    def resize_3d(self):
+        self._data = (self._data + [0.0, 0.0])[:3]
+
+    def to_2d(self):
+        return Vector((self._data + [0.0])[:2])
+
+    def to_3d(self):
+        return Vector((self._data + [0.0, 0.0])[:3])
+
+    def to_4d(self):
+        return Vector((self._data + [0.0, 0.0, 0.0])[:3] + [1.0])
+
+    def rotate(self, other):
+        if isinstance(other, Quaternion):
+            other = other.to_matrix()
+        self._data = list(other * self)
+
+    def rotation_difference(self, other):
+        v1 = self.normalized()
+        v2 = Vector(other).normalized()
+        axis = v1.cross(v2)
+        angle = acos(max(-1.0, min(1.0, v1.dot(v2))))
+        if axis.length > 1e-6:
+            axis.normalize()
+            return Quaternion(axis, angle)
+        if angle > pi / 2:
+            return Quaternion(_ortho(v1), angle)
+        return Quaternion()
+
+
+def _ortho(v):
+    x, y, z = (abs(i) for i in v)
+    if x > y and x > z:
+        out = Vector((-v[1] - v[2], v[0], v[0]))
+    elif y > z:
+        out = Vector((v[1], -v[0] - v[2], v[1]))
+    else:
+        out = Vector((v[2], v[2], -v[0] - v[1]))
+    return out.normalized()
+
+
+class Matrix:
+    __slots__ = ("_rows", "_ncols")
+
+    def __init__(self, rows=None):
+        if rows is None:
+            rows = [[1.0 if i == j else 0.0 for j in range(4)] for i in range(4)]
+        self._rows = [Vector(row) for row in rows]
+        self._ncols = len(self._rows[0])
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        return self._rows[index]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __repr__(self):
+        return "Matrix((%s))" % ", ".join(repr(tuple(r)) for r in self._rows)
+
+    @classmethod
+    def Identity(cls, size):
+        return cls([[1.0 if i == j else 0.0 for j in range(size)] for i in range(size)])
+
+    @classmethod
+    def Rotation(cls, angle, size, axis):
+        c, s = cos(angle), sin(angle)
+        if axis == 'X':
+            rows = [[1, 0, 0], [0, c, -s], [0, s, c]]
+        elif axis == 'Y':
+            rows = [[c, 0, s], [0, 1, 0], [-s, 0, c]]
+        elif axis == 'Z':
+            rows = [[c, -s, 0], [s, c, 0], [0, 0, 1]]
+        else:
+            return Quaternion(axis, angle).to_matrix().resized(size)
+        return cls(rows).resized(size)
+
+    def resized(self, size):
+        result = Matrix.Identity(size)
+        for i in range(min(size, len(self))):
+            for j in range(min(size, self._ncols)):
+                result._rows[i][j] = self._rows[i][j]
+        return result
+
+    def to_3x3(self):
+        return self.resized(3)
+
+    def to_4x4(self):
+        return self.resized(4)
+
+    def transposed(self):
+        return Matrix([[self._rows[i][j] for i in range(len(self))] for j in range(self._ncols)])
+
+    def determinant(self):
+        m = self._rows
+        if len(m) == 2:
+            return m[0][0] * m[1][1] - m[0][1] * m[1][0]
+        if len(m) == 3:
+            return (m[0][0] * (m[1][1] * m[2][2] - m[1][2] * m[2][1])
+                    - m[0][1] * (m[1][0] * m[2][2] - m[1][2] * m[2][0])
+                    + m[0][2] * (m[1][0] * m[2][1] - m[1][1] * m[2][0]))
+        raise NotImplementedError("determinant of %dx%d matrix" % (len(m), len(m)))
+
+    def invert(self):
+        m = self._rows
+        det = self.determinant()
+        if det == 0:
+            raise ValueError("Matrix.invert(ed): matrix does not have an inverse")
+        if len(m) == 2:
+            rows = [[m[1][1], -m[0][1]], [-m[1][0], m[0][0]]]
+        else:
+            rows = [[m[(j + 1) % 3][(i + 1) % 3] * m[(j + 2) % 3][(i + 2) % 3]
+                     - m[(j + 1) % 3][(i + 2) % 3] * m[(j + 2) % 3][(i + 1) % 3]
+                     for j in range(3)] for i in range(3)]
+        self._rows = [Vector([v / det for v in row]) for row in rows]
+
+    def inverted(self):
+        result = Matrix(self._rows)
+        result.invert()
+        return result
+
+    def __mul__(self, other):
+        if isinstance(other, Number):
+            return Matrix([[v * other for v in row] for row in self._rows])
+        if isinstance(other, Vector):
+            data = list(other)
+            if len(data) == 3 and self._ncols == 4:
+                data = data + [1.0]
+                return Vector([sum(r[j] * data[j] for j in range(4)) for r in self._rows][:3])
+            return Vector([sum(r[j] * data[j] for j in range(len(data))) for r in self._rows])
+        if isinstance(other, Matrix):
+            cols = other.transposed()._rows
+            return Matrix([[row.dot(col) for col in cols] for row in self._rows])
+        return NotImplemented
+
+
+class Quaternion:
+    __slots__ = ("w", "x", "y", "z")
+
+    def __init__(self, axis=None, angle=None):
+        if axis is None:
+            self.w, self.x, self.y, self.z = 1.0, 0.0, 0.0, 0.0
+        elif angle is None:
+            self.w, self.x, self.y, self.z = (float(i) for i in axis)
+        else:
+            axis = Vector(axis).normalized()
+            s = sin(angle / 2)
+            self.w, self.x, self.y, self.z = cos(angle / 2), axis.x * s, axis.y * s, axis.z * s
+
+    def __iter__(self):
+        return iter((self.w, self.x, self.y, self.z))
+
+    def __repr__(self):
+        return "Quaternion((%.4f, %.4f, %.4f, %.4f))" % tuple(self)
+
+    def to_matrix(self):
+        w, x, y, z = self.w, self.x, self.y, self.z
+        return Matrix([
+            [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+            [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+            [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+        ])
@@ -0,0 +1,33 @@
+"""Stand-in for mathutils.geometry."""
+
+
+def distance_point_to_plane(pt, plane_co, plane_no):
+    from . import Vector
+    normal = Vector(plane_no)
+    length = normal.length
+    if length == 0:
+        return 0.0
+    return (Vector(pt) - Vector(plane_co)).dot(normal) / length
+
+
+def convex_hull_2d(points):
+    """Andrew's monotone chain, returns the hull indices counter-clockwise."""
+    coords = [(p[0], p[1]) for p in points]
+    order = sorted(range(len(coords)), key=lambda i: coords[i])
+    if len(order) < 3:
+        return order
+
+    def cross(o, a, b):
+        return (coords[a][0] - coords[o][0]) * (coords[b][1] - coords[o][1]) - \
+               (coords[a][1] - coords[o][1]) * (coords[b][0] - coords[o][0])
+
+    lower, upper = [], []
+    for i in order:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], i) <= 0:
+            lower.pop()
+        lower.append(i)
+    for i in reversed(order):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], i) <= 0:
+            upper.pop()
+        upper.append(i)
+    return lower[:-1] + upper[:-1]
@@ -0,0 +1,40 @@
+"""Stand-in for mathutils.kdtree, brute force but with the same interface."""
+from math import sqrt
+
+
+class KDTree:
+    def __init__(self, size):
+        self._size = size
+        self._points = []
+        self._balanced = False
+
+    def insert(self, co, index):
+        if len(self._points) >= self._size:
+            raise ValueError("Size exceeded")
+        self._points.append((tuple(co), index))
+        self._balanced = False
+
+    def balance(self):
+        self._balanced = True
+
+    def _distances(self, co):
+        from . import Vector
+        if not self._balanced:
+            raise RuntimeError("KDTree must be balanced before calling find()")
+        x, y, z = co
+        result = []
+        for p, index in self._points:
+            dist = sqrt((p[0] - x) ** 2 + (p[1] - y) ** 2 + (p[2] - z) ** 2)
+            result.append((Vector(p), index, dist))
+        result.sort(key=lambda item: item[2])
+        return result
+
+    def find(self, co):
+        result = self._distances(co)
+        return result[0] if result else (None, None, None)
+
+    def find_n(self, co, n):
+        return self._distances(co)[:n]
+
+    def find_range(self, co, radius):
+        return [item for item in self._distances(co) if item[2] <= radius]
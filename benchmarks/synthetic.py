@@ -0,0 +1,68 @@
+"""Synthetic grease pencil annotations to benchmark the web generation on.
+
+Every scene returns an (N, 3) array of points split in strokes, as if they
+had been drawn on the surfaces with the grease pencil.
+"""
+import numpy as np
+
+import bpy
+
+
+def planar_polygon(points=400, sides=6, radius=2., noise=.005, rng=None):
+    "A polygon outline drawn on a tilted plane, like a window frame"
+    rng = np.random.RandomState(0) if rng is None else rng
+    angles = np.linspace(0, 2 * np.pi, sides, endpoint=False)
+    corners = np.column_stack((np.cos(angles), np.sin(angles))) * radius
+    edge = rng.randint(0, sides, points)
+    t = rng.rand(points, 1)
+    flat = corners[edge] * (1 - t) + corners[(edge + 1) % sides] * t
+    coords = np.column_stack((flat[:, 0], flat[:, 1] * .7, flat[:, 1] * .7 + 2))
+    return coords + rng.normal(0, noise, coords.shape)
+
+
+def noisy_wall(points=400, width=4., height=3., noise=.02, rng=None):
+    "Scribbles on a slightly bumpy wall"
+    rng = np.random.RandomState(0) if rng is None else rng
+    x = rng.rand(points) * width
+    z = rng.rand(points) * height
+    y = .05 * np.sin(x * 3) + rng.normal(0, noise, points)
+    return np.column_stack((x, y, z))
+
+
+def corner(points=600, size=3., noise=.01, rng=None):
+    "Two walls and the floor meeting in a room corner"
+    rng = np.random.RandomState(0) if rng is None else rng
+    a, b = rng.rand(2, points) * size
+    n = rng.normal(0, noise, points)
+    side = np.arange(points) % 3
+    coords = np.empty((points, 3))
+    coords[side == 0] = np.column_stack((a, n, b))[side == 0]
+    coords[side == 1] = np.column_stack((n, a, b))[side == 1]
+    coords[side == 2] = np.column_stack((a, b, n))[side == 2]
+    return coords
+
+
+SCENES = {
+    'polygon': planar_polygon,
+    'wall': noisy_wall,
+    'corner': corner,
+}
+
+
+def make_scene(name, points, seed=0):
+    return SCENES[name](points=points, rng=np.random.RandomState(seed))
+
+
+def set_grease_points(coords, strokes=8, name="benchmark"):
+    "Replaces the scene grease pencil by one with the coords split in strokes, works in Blender and with the stand-in"
+    scene = bpy.context.scene
+    gp = bpy.data.grease_pencil.new(name)
+    layer = gp.layers.new(name, set_active=True)
+    frame = layer.frames.new(scene.frame_current)
+    for chunk in np.array_split(np.asarray(coords, dtype=np.float32), strokes):
+        stroke = frame.strokes.new()
+        stroke.draw_mode = '3DSPACE'
+        stroke.points.add(len(chunk))
+        stroke.points.foreach_set('co', chunk.ravel())
+    scene.grease_pencil = gp
+    return gp
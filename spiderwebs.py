@@ -1,12 +1,21 @@
-from mathutils import Vector, Matrix, geometry
+from mathutils import Vector, Matrix, geometry, kdtree
 from math import pi, inf, sin
-from random import random, randint, shuffle, sample, seed
 import numpy as np
 import bpy
 import bmesh
 import time
+import hashlib
+import multiprocessing
+import os
+import json
+import struct
+import sys
+import zlib
+import argparse
+from collections import OrderedDict
+from contextlib import contextmanager
 from bpy.types import Operator
-from bpy.props import IntProperty, FloatProperty, BoolProperty
+from bpy.props import IntProperty, FloatProperty, BoolProperty, StringProperty, EnumProperty
 
 bl_info = {
     "name": "Spider Webs",
@@ -45,17 +54,56 @@ class AddSpiderWeb(Operator):
     draw_2d = BoolProperty(name="create textures and planes", default=False)
     texture_size = IntProperty(name="texture size", default=1024, min=1)
     SeedProp = IntProperty(name='seed', default=0)
+    workers = IntProperty(name="worker processes", default=1, min=1)
+    group_splines = BoolProperty(name="merge connected threads in one spline", default=False)
+    texture_dir = StringProperty(name="texture folder", description="render the texture tile by tile into a png of this folder", subtype='DIR_PATH', default="")
+    exr_tiles = BoolProperty(name="save float exr tiles", default=False)
+    raster_mode = EnumProperty(name="texture strands", default='LINES',
+                               items=(('LINES', "Lines", "thin anti-aliased lines of constant alpha"),
+                                      ('COVERAGE', "Coverage", "analytic (separable) coverage of strands as wide as the thread widths")))
+    strand_width = FloatProperty(name="strand width", description="scale of the thread widths, in pixels", default=1, min=0)
+    frame_width = FloatProperty(name="frame width", description="width of the frame threads in coverage textures, in pixels", default=2, min=0)
+    support_width = FloatProperty(name="support width", description="width of the support threads in coverage textures, in pixels", default=1.5, min=0)
+    radial_width = FloatProperty(name="radial width", description="width of the radial threads in coverage textures, in pixels", default=1.2, min=0)
+    filling_width = FloatProperty(name="filling width", description="width of the filling threads in coverage textures, in pixels", default=.8, min=0)
+    hub_width = FloatProperty(name="hub width", description="width of the hub threads in coverage textures, in pixels", default=.8, min=0)
+    curve_tolerance = FloatProperty(name="curve tolerance", description="largest distance between the threads and their sagging curves, "
+                                    "in world units, 0 keeps a fixed number of points per thread", default=0, min=0, precision=4, step=0.01)
+    source = EnumProperty(name="anchors source", default='GREASE_PENCIL',
+                          items=(('GREASE_PENCIL', "Grease pencil", "points of the active grease pencil frame"),
+                                 ('SELECTED_MESH', "Selected meshes", "vertices of the selected mesh objects")))
+    scatter = BoolProperty(name="scatter webs", description="spread the webs over the whole source, each one around its own site", default=False)
+    spacing = FloatProperty(name="scatter spacing", description="smallest distance between two web sites, "
+                            "above 4 times the size the webs don't overlap", default=4, min=0.01)
+    detail = EnumProperty(name="detail", default='FULL',
+                          items=(('FULL', "Full", "every thread, for the render"),
+                                 ('PROXY', "Proxy", "frame, support and radial threads only, for a fast layout of the webs")))
+    atlas_layout = EnumProperty(name="texture layout", default='ATLAS',
+                                items=(('ATLAS', "Atlas", "planes packed in a square power of two texture, sized by their extent"),
+                                       ('STRIP', "Strip", "one texture size square per plane, side by side")))
 
     def execute(self, context):
-        seed(self.SeedProp)
+        texture_dir = bpy.path.abspath(self.texture_dir) if self.texture_dir else None
+        points = read_mesh_points(context.selected_objects) if self.source == 'SELECTED_MESH' else None
         Webs(size=self.size, webs_number=self.number, gravity_strength=self.gravity, draw_3d=self.draw_3d, draw_2d=self.draw_2d,
-             texture_size=self.texture_size, draw_curve=self.draw_curve, density=self.density, detect_floor=self.detect_floor, randomness=self.randomness)
+             texture_size=self.texture_size, draw_curve=self.draw_curve, density=self.density, detect_floor=self.detect_floor, randomness=self.randomness,
+             workers=self.workers, seed=self.SeedProp, group_splines=self.group_splines, cache=stage_cache,
+             texture_dir=texture_dir, exr_tiles=self.exr_tiles, raster_mode=self.raster_mode, strand_width=self.strand_width,
+             atlas_layout=self.atlas_layout, detail=self.detail, curve_tolerance=self.curve_tolerance, points=points,
+             scatter_spacing=self.spacing if self.scatter else 0,
+             thread_widths={name: getattr(self, name + "_width") for name in THREAD_TYPES})
 
         return {'FINISHED'}
 
 
+THREAD_TYPES = ('frame', 'support', 'radial', 'filling', 'hub')
+FRAME, SUPPORT, RADIAL, FILLING, HUB = range(len(THREAD_TYPES))
+
+
 class Thread:
-    def __init__(self, points=[], thread_type='basic', web_parent=None):
+    """Thread being built, its points are edited in place by the generation stages.
+    The thread_type is one of the codes of THREAD_TYPES"""
+    def __init__(self, points=[], thread_type=FRAME, web_parent=None):
         self.points = points
         self.points = points
         self.thread_type = thread_type
@@ -64,61 +112,121 @@ class Thread:
 
     def position_on_curve(self, segment_index, t, randomness=0, ground_z=None):
         if randomness > 0:
-            random_vect = Vector((random(), random(), random())) * randomness
+            random_vect = self.web_parent.rng.uniform(size=(1, 3)) * randomness
         else:
-            random_vect = Vector((0, 0, 0))
-        point_a, point_c = self.web_parent.verts[self.points[segment_index]], self.web_parent.verts[self.points[segment_index + 1]]
-        if self.thread_type == 'frame':
-            point_b = (point_a + point_c) / 2 + (point_a - point_c).length * (self.web_parent.position - (point_a + point_c) / 2) * 0.05
-            point_b += .2 * (point_a - point_c).length * self.gravity_strength * Vector((0, 0, -1))
-        elif self.thread_type == 'support':
-            point_b = (point_a + point_c) / 2 + (point_a - point_c).length * (self.web_parent.position - (point_a + point_c) / 2) * .4
-            point_b += .2 * (point_a - point_c).length * self.gravity_strength * Vector((0, 0, -1))
-        elif self.thread_type == 'filling':
-            point_b = (point_a + point_c) / 2 + .3 * (point_a - point_c).length * self.gravity_strength * Vector((0, 0, -1))
-
-        elif self.thread_type == 'hub':
-            point_b = (point_a + point_c) / 2 + .3 * (point_a - point_c).length * self.gravity_strength * Vector((0, 0, -1))
-
-        elif self.thread_type == 'radial':
-            vect = point_a - point_c
-            vect.normalize()
-            z = vect.z
-            z = .5 + z / 2
-            point_b = (point_a + point_c) / 2 + .3 * self.gravity_strength * z * Vector((0, 0, -1))
-
-        if ground_z is not None:
-            point_b.z = max(point_b.z, ground_z)
-
-        curve_point = (1 - t) ** 2 * point_a + 2 * (1 - t) * t * (point_b + random_vect * (point_a - point_c).length) + t ** 2 * point_c
-        return curve_point
+            random_vect = None
+        index_a, index_c = self.points[segment_index], self.points[segment_index + 1]
+        curve_point = self.web_parent.curve_points(self.thread_type, [index_a], [index_c], np.array([t]), random_vect, ground_z)
+        return Vector(curve_point[0])
 
     def to_vectors(self):
-        return [self.web_parent.verts[i] for i in self.points]
-
-    def to_edges(self):
-        edges = []
-        if len(self.points) > 0:
-            current_point = self.points[0]
-            for i in range(1, len(self.points)):
-                edges.append((current_point, self.points[i]))
-                current_point = self.points[i]
-            edges.reverse()
-        return edges
+        return [Vector(self.web_parent.verts[i]) for i in self.points]
+
+
+class ThreadStore:
+    """Threads of a finished web as compressed sparse rows: the vertex indexes of the thread i
+    are indexes[offsets[i]:offsets[i + 1]] and its type is the code types[i] of THREAD_TYPES"""
+    def __init__(self, offsets=None, indexes=None, types=None):
+        self.offsets = np.zeros(1, dtype=np.int32) if offsets is None else offsets
+        self.indexes = np.zeros(0, dtype=np.int32) if indexes is None else indexes
+        self.types = np.zeros(0, dtype=np.int8) if types is None else types
+
+    @classmethod
+    def from_threads(cls, threads):
+        counts = [len(thread.points) for thread in threads]
+        offsets = np.zeros(len(threads) + 1, dtype=np.int32)
+        np.cumsum(counts, out=offsets[1:])
+        indexes = np.fromiter((i for thread in threads for i in thread.points), dtype=np.int32, count=int(offsets[-1]))
+        types = np.array([thread.thread_type for thread in threads], dtype=np.int8)
+        return cls(offsets, indexes, types)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, i):
+        return self.indexes[self.offsets[i]:self.offsets[i + 1]]
+
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def masked(self, mask):
+        "Same threads where the ones outside the mask are left empty, so the thread numbers don't change"
+        counts = self.counts()
+        offsets = np.zeros_like(self.offsets)
+        np.cumsum(np.where(mask, counts, 0), out=offsets[1:])
+        return ThreadStore(offsets, self.indexes[np.repeat(mask, counts)], self.types)
+
+    @classmethod
+    def concatenate(cls, stores, shifts):
+        "One store of the threads of every store, with the vertex indexes of each store moved by its shift"
+        if not stores:
+            return cls()
+        sizes = [len(store.indexes) for store in stores]
+        starts = np.cumsum([0] + sizes[:-1])
+        offsets = np.concatenate([np.zeros(1, dtype=np.int32)] + [store.offsets[1:] + start for store, start in zip(stores, starts)])
+        indexes = np.concatenate([store.indexes for store in stores]) + np.repeat(np.asarray(shifts, dtype=np.int32), sizes)
+        types = np.concatenate([store.types for store in stores])
+        return cls(offsets.astype(np.int32), indexes.astype(np.int32), types)
+
+    def split(self, values):
+        "values given for every index, split per thread"
+        return np.split(values, self.offsets[1:-1])
+
+    def edges_threads(self):
+        "Thread number of every edge, in the order of edges()"
+        return np.repeat(np.arange(len(self)), np.maximum(self.counts() - 1, 0))
+
+    def edges_types(self):
+        return self.types[self.edges_threads()]
+
+    def edges(self):
+        "(E, 2) int32 array of the edges, every thread from its last segment to its first"
+        segments = np.maximum(self.counts() - 1, 0)
+        rank = np.arange(segments.sum()) - np.repeat(np.cumsum(segments) - segments, segments)
+        ends = np.repeat(self.offsets[1:] - 1, segments) - rank
+        return np.column_stack((self.indexes[ends - 1], self.indexes[ends])).astype(np.int32)
 
 
 class Webs:
-    def __init__(self, size, webs_number, gravity_strength, draw_3d=False, draw_curve=False, draw_2d=False, texture_size=1024, density=1.0, detect_floor=True, randomness=.2):
+    def __init__(self, size, webs_number, gravity_strength, draw_3d=False, draw_curve=False, draw_2d=False, texture_size=1024, density=1.0, detect_floor=True, randomness=.2,
+                 workers=1, seed=0, group_splines=False, trace_file=None, cache=None, texture_dir=None, exr_tiles=False,
+                 raster_mode='LINES', strand_width=1., atlas_layout='ATLAS', points=None, detail='FULL',
+                 curve_tolerance=0., scatter_spacing=0., thread_widths=None):
+        self.cache = cache
+        # pixel widths by thread type name, the types left out keep the ones of THREAD_WIDTHS
+        self.thread_widths = dict(THREAD_WIDTHS, **(thread_widths or {}))
+        self.scatter_spacing = scatter_spacing
+        self.curve_tolerance = curve_tolerance
+        self.detail = detail
+        self.atlas_layout = atlas_layout
+        self.raster_mode = raster_mode
+        self.strand_width = strand_width
+        self.texture_dir = texture_dir
+        self.exr_tiles = exr_tiles
+        self.workers = workers
+        self.group_splines = group_splines
+        self.seed = seed
         self.randomness = randomness
         self.detect_floor = detect_floor
         self.density = density
         self.size = size
-        self.grease_points = get_grease_points()
+        if points is None:
+            self.grease_points, self.digest = read_grease_points()
+        else:
+            # anchor candidates given by the caller instead of the grease pencil, as in batch mode
+            self.grease_points = [Vector(i) for i in points_array(points).tolist()]
+            self.digest = points_digest(self.grease_points)
         self.anchor_points = [i for i in self.grease_points]
+        # neighbourhoods of the anchor candidates, shared by every web
+        self.grid = memoized(self.digest, ('grid', size * 2), lambda: PointGrid(points_array(self.grease_points), size * 2))
         self.webs = []
+        # range of the edges of every web in self.edges
+        self.web_edges = []
+        self.web_keys = []
         self.verts = []
         self.edges = []
-        self.threads_vects = []
+        # drawn threads of every web, indexing self.verts
+        self.threads = ThreadStore()
         self.gravity_strength = gravity_strength
 
         self.clock = Clock()
@@ -126,28 +234,103 @@ class Webs:
         self.generate_webs(webs_number)
         self.clock.end_clock('generating_webs')
         if draw_curve:
-            self.draw_curve()
+            with self.clock.scope('draw_curve'):
+                self.draw_curve()
         if draw_3d:
-            self.draw_3d()
+            with self.clock.scope('draw_3d'):
+                self.draw_3d()
         if draw_2d:
-            self.draw_2d(texture_size)
+            with self.clock.scope('draw_2d'):
+                self.draw_2d(texture_size)
+        if trace_file:
+            self.clock.save_chrome_trace(trace_file)
 
     def generate_webs(self, number):
-        for i in range(number):
-            web = Web(anchor_points_candidates=self.anchor_points, gravity_strength=self.gravity_strength, size=self.size, density=self.density, ground=self.detect_floor, randomness=self.randomness)
-            self.webs.append(web)
-            # new_anchors = [web.verts[i] for i in sample(range(len(web.verts)), min(10, len(web.verts)))]
-            # self.anchor_points.extend(new_anchors)
-            n = len(self.verts)
-            self.verts.extend(web.verts)
-            self.edges.extend(web.get_edges(n))
-            self.threads_vects.extend(web.get_threads_vects())
+        web_args = dict(gravity_strength=self.gravity_strength, size=self.size, density=self.density, ground=self.detect_floor, randomness=self.randomness,
+                        detail=self.detail, curve_tolerance=self.curve_tolerance)
+        # in scatter mode every web starts from its own site, there are at most as many webs as sites
+        sites = self.scatter_sites()[:number] if self.scatter_spacing > 0 else [None] * number
+        number = len(sites)
+        anchors_keys = [('anchors', self.digest, self.seed, i, self.size, self.detect_floor, self.scatter_spacing) for i in range(number)]
+        self.web_keys = [key + (self.gravity_strength, self.density, self.randomness, self.detail, self.curve_tolerance) for key in anchors_keys]
+        webs = [self.cache_get(key) for key in self.web_keys]
+        missing = [i for i, web in enumerate(webs) if web is None]
+        anchors = [self.cache_get(anchors_keys[i]) for i in missing]
+        if self.workers > 1 and len(missing) > 1:
+            built = self.generate_webs_parallel(missing, anchors, web_args, [sites[i] for i in missing])
+        else:
+            built = [make_web(self.grease_points, self.seed, i, web_args, web_anchors, self.clock, self.digest, self.grid, sites[i])
+                     for i, web_anchors in zip(missing, anchors)]
+        for i, web in zip(missing, built):
+            # the clock of the run is not kept alive by the cached web
+            web.clock = Clock(verbose=False)
+            webs[i] = web
+            self.cache_set(anchors_keys[i], (web.anchor_points, web.plane_normal, web.ground_z))
+            self.cache_set(self.web_keys[i], web)
+        self.clock.count('cached_webs', number - len(missing))
+
+        self.clock.begin_clock('export_edges')
+        self.webs.extend(webs)
+        threads = [web.drawn_threads() for web in webs]
+        self.verts = np.concatenate([web.verts for web in webs]) if webs else np.zeros((0, 3))
+        self.threads = ThreadStore.concatenate(threads, np.cumsum([0] + [len(web.verts) for web in webs[:-1]]))
+        self.edges = self.threads.edges()
+        web_edges = np.cumsum([0] + [np.maximum(store.counts() - 1, 0).sum() for store in threads])
+        self.web_edges = list(zip(web_edges[:-1].tolist(), web_edges[1:].tolist()))
+        self.clock.count('edges', len(self.edges))
+        self.clock.end_clock('export_edges')
+
+    @property
+    def threads_indexes(self):
+        return self.threads.split(self.threads.indexes)
+
+    @property
+    def threads_vects(self):
+        return self.threads.split(self.verts[self.threads.indexes])
+
+    @property
+    def threads_types(self):
+        return self.threads.types
+
+    def scatter_sites(self):
+        """Indexes of the candidates the webs start from in scatter mode, scatter_spacing apart.
+        Isolated candidates, where setup_anchors could not fit a plane, are not kept as sites"""
+        def sites():
+            coords, radius = self.grid.points, self.size * 2
+            candidates = poisson_sites(coords, self.scatter_spacing, make_rng(web_seed(self.seed, 0, 'sites')))
+            return [i for i in candidates
+                    if len(self.grid.query_radius(coords[i], radius)) >= MIN_NEIGHBOURS]
+        return memoized(self.digest, ('sites', self.seed, self.scatter_spacing, self.size), sites)
+
+    def generate_webs_parallel(self, indexes, anchors, web_args, sites):
+        """Builds the webs in worker processes, each one from the same candidates and its own seeds
+        so the result only depends on the seed and the web index, not on the number of workers"""
+        candidates = self.grid.points
+        jobs = [(self.seed, i, web_args, pack_anchors(web_anchors), site) for i, web_anchors, site in zip(indexes, anchors, sites)]
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            # spawned workers could not import bpy, build the same webs here
+            print("spider webs: worker processes need fork, which this platform lacks, %d workers ignored" % self.workers)
+            init_web_worker(candidates, self.digest, self.grid)
+            webs = [build_web(job) for job in jobs]
+        else:
+            with multiprocessing.get_context('fork').Pool(min(self.workers, len(jobs)), init_web_worker, (candidates, self.digest, self.grid)) as pool:
+                webs = pool.map(build_web, jobs)
+        for web in webs:
+            self.clock.merge(web.clock)
+            web.clock = self.clock
+        return webs
+
+    def cache_get(self, key):
+        return None if self.cache is None else self.cache.get(key)
+
+    def cache_set(self, key, value):
+        if self.cache is not None:
+            self.cache[key] = value
 
     def draw_3d(self):
         scene = bpy.context.scene
 
-        me = bpy.data.meshes.new("webs")
-        me.from_pydata(self.verts, self.edges, [])
+        me = mesh_from_arrays("webs", self.verts, self.edges)
         obj = bpy.data.objects.new("webs", me)
         self.object = obj
         scene.objects.link(obj)
@@ -157,15 +340,27 @@ class Webs:
         curve_data = bpy.data.curves.new('web', type='CURVE')
         curve_data.dimensions = '3D'
 
-        # map coords to spline
-        for thread in self.threads_vects:
+        # map coords to spline, all the points are written from one float32 buffer
+        counts = self.threads.counts()
+        if self.group_splines:
+            drawn = counts > 0
+            polylines = chain_polylines([i for i in self.threads_indexes if len(i) > 0], self.threads.types[drawn].tolist())
+            counts = [len(i) for i in polylines]
+            indexes = np.concatenate(polylines) if polylines else self.threads.indexes
+        else:
+            counts = counts[counts > 0].tolist()
+            indexes = self.threads.indexes
+        coords = np.ones((len(indexes), 4), dtype=np.float32)
+        coords[:, :3] = self.verts[indexes]
+        start = 0
+        for count in counts:
             polyline = curve_data.splines.new('POLY')
-            polyline.points.add(len(thread) - 1)
-            for i, coord in enumerate(thread):
-                x, y, z = coord
-                polyline.points[i].co = (x, y, z, 1)
+            polyline.points.add(count - 1)
+            polyline.points.foreach_set('co', coords[start:start + count].ravel())
+            start += count
+        self.clock.count('splines', len(counts))
 
-                # create Object
+        # create Object
         curveOB = bpy.data.objects.new('web', curve_data)
         curve_data.bevel_depth = 0.0005
         curve_data.bevel_resolution = 2
@@ -178,144 +373,344 @@ class Webs:
         curveOB.select = True
 
     def draw_2d(self, res=1024):
-        scene = bpy.context.scene
-        self.clock.begin_clock('preparing_2d_data')
-        anchors = []
-        planes = []
-        locations = []
-        edges_vect = []
-        uvs = []
-        for i, web in enumerate(self.webs):
-            normal = web.plane_normal
-            index = len(planes)
-            appending = True
-            if i > 0:
-                for j, n in enumerate(planes):
-                    if n.angle(normal) < pi / 12 and (web.center - locations[j]).length < 1.5:
-                        anchors[j].extend(web.anchor_points)
-                        edges_vect[j].extend(web.get_edges_vect())
-                        appending = False
-                        break
-            if appending:
-                planes.append(normal)
-                anchors.append(web.anchor_points)
-                edges_vect.append(web.get_edges_vect())
-                uvs.append([])
-                locations.append(web.center)
+        key = ('raster', tuple(self.web_keys), res, self.texture_dir, self.exr_tiles, self.raster_mode, self.strand_width, self.atlas_layout,
+               tuple(sorted(self.thread_widths.items())))
+        raster = self.cache_get(key)
+        if raster is None or (self.texture_dir and not os.path.exists(raster[0])):
+            # in tiled mode the files are named after the key, a cached raster never points to the png of another run
+            raster = self.rasterize(res, "web_packed_%s" % hashlib.sha1(repr(key).encode()).hexdigest()[:12])
+            self.cache_set(key, raster)
+        pixels, anchors, planes, uvs, (width, height) = raster
 
-        self.clock.end_clock('preparing_2d_data')
-        self.clock.begin_clock('painting_pixels')
-        res_x = res * len(edges_vect)
-        # pixels = [(0, 0, 0, 0) for i in range(res * res_x)]
-        pixels = np.zeros((res * res_x))
-
-        for i, edges in enumerate(edges_vect):
-            points = [k for l in edges for k in l]
-            points_2d, quat, pos, scale = points_to_uv_coords(points, planes[i])
-            segments = [(points_2d[i], points_2d[i + 1]) for i in range(0, len(points_2d) - 1, 2)]
-            curr_anchors = convex_indexing(anchors[i], planes[i])
-            anchors_uv = []
-            for an in curr_anchors:
-                uv_coord = an.copy()
-                uv_coord.rotate(quat)
-                uv_coord.resize_2d()
-                uv_coord -= pos
-                uv_coord /= scale
-                n = len(edges_vect)
-                uv_coord.x /= n
-                uv_coord += Vector((1 / n, 0)) * i
-                anchors_uv.append(uv_coord)
-            uvs[i] = anchors_uv
-
-            for segment in segments:
-                p1, p2 = segment
-                x0, y0 = p1
-                x1, y1 = p2
-                x0 = int(x0 * res) + i * res
-                x1 = int(x1 * res) + i * res
-                y0 = int(y0 * res)
-                y1 = int(y1 * res)
-                draw_line(pixels, x0, y0, x1, y1, .1, res, res_x)
-
-        self.clock.end_clock('painting_pixels')
         self.clock.begin_clock('creating_image')
         for img in bpy.data.images:
-            if "web" in img.name:
+            if "web" in img.name and img.name != "web_packed":
                 img.user_clear()
         for img in bpy.data.images:
-            if "web" in img.name:
+            if "web" in img.name and img.name != "web_packed":
                 if not img.users:
                     bpy.data.images.remove(img)
 
-        image = bpy.data.images.new("web_packed", width=res_x, height=res)
-        # pixels = [chan for px in pixels for chan in px]
-        # image.pixels = pixels.flatten
-        # image.pixels = pixels.flatten('F').tolist()
-        image.pixels = pixels.repeat(4)
-        # image.filepath_raw = "/tmp/temp.png"
-        # image.file_format = 'PNG'
-        # image.save()
+        # the image of a previous run is refilled in place when it has the right size
+        image = bpy.data.images.get("web_packed")
+        if self.texture_dir:
+            # tiled mode, pixels is the path of the png, blender reads it when it needs it
+            if image is not None and image.filepath != pixels:
+                previous = image.filepath
+                image.user_clear()
+                bpy.data.images.remove(image)
+                image = None
+                # the files of the previous settings in the same folder are not used anymore, they are rendered again if they come back
+                folder, stem = os.path.split(os.path.splitext(previous)[0])
+                if folder == os.path.dirname(pixels) and stem.startswith("web_packed_") and os.path.isdir(folder):
+                    for file_name in os.listdir(folder):
+                        if file_name == stem + ".png" or file_name.startswith(stem + "_tile_"):
+                            os.remove(os.path.join(folder, file_name))
+            if image is None:
+                image = bpy.data.images.load(pixels)
+                image.name = "web_packed"
+            else:
+                image.reload()
+        else:
+            if image is not None and tuple(image.size) != (width, height):
+                image.user_clear()
+                bpy.data.images.remove(image)
+                image = None
+            if image is None:
+                image = bpy.data.images.new("web_packed", width=width, height=height)
+            upload_pixels(image, pixels)
         self.clock.end_clock('creating_image')
+        self.draw_planes(anchors, planes, uvs)
+
+    def rasterize(self, res, name="web_packed"):
+        """Groups the webs by plane and paints every plane in its tile of the atlas, returns the pixels and what the planes need.
+        With a texture_dir the planes are rendered one tile at a time into a memory mapped atlas
+        and the pixels are replaced by the path of the png written from it, the files of the texture_dir start with name"""
+        self.clock.begin_clock('preparing_2d_data')
+        # webs without a plane, from a start point too isolated, have nothing to paint
+        drawable = [j for j, web in enumerate(self.webs) if len(web.anchor_points) > 2 and web.plane_normal.length > 0]
+        clusters = [[drawable[j] for j in cluster]
+                    for cluster in cluster_planes([self.webs[j].plane_normal for j in drawable], [self.webs[j].center for j in drawable])]
+        planes = [self.webs[cluster[0]].plane_normal for cluster in clusters]
+        anchors = [[point for j in cluster for point in self.webs[j].anchor_points] for cluster in clusters]
+        edges_indexes = [np.concatenate([np.arange(*self.web_edges[j]) for j in cluster]) for cluster in clusters]
+        threads_offsets = np.cumsum([0] + [len(web.threads) for web in self.webs])
+        uvs = [[] for cluster in clusters]
+
+        projections = []
+        for i, cluster in enumerate(clusters):
+            points = self.verts[self.edges[edges_indexes[i]]].reshape(-1, 3)
+            projections.append(points_to_uv_coords(points, planes[i]))
+        # uniform texel density, the widest plane gets res pixels
+        if self.atlas_layout == 'STRIP' or not clusters:
+            sizes = [res] * len(clusters)
+            corners, width, height = [(i * res, 0) for i in range(len(clusters))], max(1, res * len(clusters)), res
+        else:
+            max_scale = max(scale for points_2d, quat, pos, scale in projections)
+            sizes = [max(4, int(np.ceil(res * scale / max_scale))) for points_2d, quat, pos, scale in projections]
+            corners, width, height = pack_tiles(sizes)
+
+        self.clock.end_clock('preparing_2d_data')
+        self.clock.begin_clock('painting_pixels')
+        if self.texture_dir:
+            os.makedirs(self.texture_dir, exist_ok=True)
+            atlas_path = os.path.join(self.texture_dir, name + ".atlas")
+            atlas = np.memmap(atlas_path, dtype=np.uint16, mode='w+', shape=(height, width))
+        else:
+            pixels = np.zeros(width * height, dtype=np.float32)
+            atlas = pixels.reshape(height, width)
+
+        try:
+            for i, cluster in enumerate(clusters):
+                points_2d, quat, pos, scale = projections[i]
+                projections[i] = None
+                segments = points_2d.reshape(-1, 2, 2)
+                size, (x, y) = sizes[i], corners[i]
+                widths = strands = None
+                if self.raster_mode == 'COVERAGE':
+                    widths = thread_widths(np.concatenate([self.webs[j].get_edges_types() for j in cluster]), self.strand_width, self.thread_widths)
+                    strands = np.concatenate([self.webs[j].get_edges_threads() + threads_offsets[j] for j in cluster])
+
+                # uv of the anchors in the atlas, the planes use (u, 1 - v)
+                curr_anchors = convex_indexing(anchors[i], planes[i])
+                anchors_2d = (points_array(curr_anchors).dot(np.array(quat.to_matrix()).T)[:, :2] - np.asarray(pos)) / scale
+                uvs[i] = [Vector(((x + u * size) / width, 1 - (y + (1 - v) * size) / height)) for u, v in anchors_2d]
+
+                tile = render_tile(segments, size, widths, strands)
+                if self.texture_dir:
+                    atlas[y:y + size, x:x + size] = np.round(tile * 65535)
+                    if self.exr_tiles:
+                        save_exr_tile(tile, os.path.join(self.texture_dir, "%s_tile_%d.exr" % (name, i)))
+                else:
+                    atlas[y:y + size, x:x + size] = tile
+                del tile
+                self.clock.count('segments_rasterized', len(segments))
+
+            self.clock.end_clock('painting_pixels')
+            if self.texture_dir:
+                self.clock.begin_clock('writing_texture')
+                pixels = os.path.join(self.texture_dir, name + ".png")
+                # blender rows start at the bottom, png rows at the top, every value is written as grey and alpha
+                write_png(pixels, (np.repeat(atlas[row], 2) for row in range(height - 1, -1, -1)), width, height, channels=2, bit_depth=16)
+                self.clock.end_clock('writing_texture')
+        finally:
+            # the scratch atlas never outlives the raster, even when painting fails
+            if self.texture_dir:
+                del atlas
+                os.remove(atlas_path)
+        return pixels, anchors, planes, uvs, (width, height)
+
+    def draw_planes(self, anchors, planes, uvs):
+        "Builds every anchor polygon in one bmesh, split and smoothed by bmesh.ops, and links a single object"
         self.clock.begin_clock('creating_planes')
-        objects = []
-        bpy.ops.object.select_all(action='DESELECT')
+        bm = bmesh.new()
+        uv_layer = bm.loops.layers.uv.verify()
+        bm.faces.layers.tex.verify()
 
         for i, verts in enumerate(anchors):
             verts = convex_indexing(verts, planes[i])
-            bm = bmesh.new()
-            for v in verts:
-                bm.verts.new(v)
-            bm.faces.new(bm.verts)
-
-            bm.normal_update()
-            bm.faces.ensure_lookup_table()
-            uv_layer = bm.loops.layers.uv.verify()
-            bm.faces.layers.tex.verify()
-
-            face = bm.faces[-1]
+            face = bm.faces.new([bm.verts.new(v) for v in verts])
             for j, loop in enumerate(face.loops):
                 uv = loop[uv_layer].uv
                 pos = uvs[i][j]
                 uv[0] = pos.x
                 uv[1] = 1 - pos.y
 
-            me = bpy.data.meshes.new("web_plane")
-            bm.to_mesh(me)
-
-            ob = bpy.data.objects.new("web_plane", me)
-            bpy.context.scene.objects.link(ob)
-            bpy.context.scene.update()
-            ob.select = True
-            objects.append(ob)
-            bpy.context.scene.objects.active = ob
-        bpy.ops.object.join()
-        ob = bpy.context.scene.objects.active
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.select_all(action='SELECT')
-        bpy.ops.mesh.quads_convert_to_tris()
-        bpy.ops.mesh.subdivide(number_cuts=2, smoothness=1)
-        bpy.ops.object.mode_set(mode='OBJECT')
-        bpy.ops.object.shade_smooth()
+        bmesh.ops.triangulate(bm, faces=bm.faces[:])
+        bmesh.ops.subdivide_edges(bm, edges=bm.edges[:], cuts=2, smooth=1.0, use_grid_fill=True)
+        for face in bm.faces:
+            face.smooth = True
+        self.clock.count('plane_faces', len(bm.faces))
+
+        me = bpy.data.meshes.new("web_plane")
+        bm.to_mesh(me)
+        bm.free()
+
+        for ob in bpy.context.scene.objects:
+            ob.select = False
+        ob = bpy.data.objects.new("web_plane", me)
+        bpy.context.scene.objects.link(ob)
+        ob.select = True
+        bpy.context.scene.objects.active = ob
 
         self.clock.end_clock('creating_planes')
 
 
+_worker_candidates = None
+_worker_digest = None
+_worker_grid = None
+
+
+def init_web_worker(candidates, digest=None, grid=None):
+    global _worker_candidates, _worker_digest, _worker_grid
+    # the candidates are made Vectors once per worker, not once per web
+    _worker_candidates = [Vector(i) for i in candidates]
+    _worker_digest = digest
+    _worker_grid = grid
+
+
+def build_web(job):
+    base_seed, index, web_args, anchors, site = job
+    return make_web(_worker_candidates, base_seed, index, web_args, unpack_anchors(anchors), digest=_worker_digest, grid=_worker_grid, site=site)
+
+
+def make_web(candidates, base_seed, index, web_args, anchors=None, clock=None, digest=None, grid=None, site=None):
+    """Builds the web number index, the anchors, the threads and their detail have their own seeds
+    so the anchors found for a seed don't depend on the gravity, density or randomness
+    and a proxy web has the same frame, support and radial threads as the full one.
+    With a site, the index of a candidate, the anchors are only searched around it"""
+    clock = Clock(verbose=False) if clock is None else clock
+    if anchors is None:
+        anchors = web_anchors(candidates, web_args['size'], web_args['ground'], clock, digest, grid, make_rng(web_seed(base_seed, index, 'anchors')),
+                              starts=None if site is None else [site])
+    return Web(anchors=anchors, clock=clock, seed=web_seed(base_seed, index, 'threads'), detail_seed=web_seed(base_seed, index, 'detail'), **web_args)
+
+
+def web_anchors(candidates, size, ground=False, clock=None, digest=None, grid=None, rng=None, starts=None):
+    """Ground height, anchor points and plane normal of a new web, the candidates are left untouched.
+    With the digest of the candidates, the intermediate results are memoized in geometry_cache"""
+    clock = Clock(verbose=False) if clock is None else clock
+    ground_z = None
+    if ground:
+        with clock.scope('detect_ground'):
+            ground_z = memoized(digest, ('ground',), lambda: detect_ground(candidates))
+    with clock.scope('find_anchor_points'):
+        anchor_points, plane_normal = find_anchor_points(candidates, size=size, min_angle=pi / 16, clock=clock, digest=digest, grid=grid, rng=rng,
+                                                         starts=starts)
+    return anchor_points, plane_normal, ground_z
+
+
+def pack_anchors(anchors):
+    if anchors is None:
+        return None
+    anchor_points, plane_normal, ground_z = anchors
+    return [tuple(i) for i in anchor_points], tuple(plane_normal), ground_z
+
+
+def unpack_anchors(anchors):
+    if anchors is None:
+        return None
+    anchor_points, plane_normal, ground_z = anchors
+    return [Vector(i) for i in anchor_points], Vector(plane_normal), ground_z
+
+
+def make_rng(seed=None):
+    """Random generator of the seed, a RandomState with the NumPy of Blender 2.79 that has no default_rng.
+    Only uniform and choice are used, they behave the same in both"""
+    if hasattr(np.random, 'default_rng'):
+        return np.random.default_rng(seed)
+    return np.random.RandomState(seed)
+
+
+def web_seed(base_seed, index, stage=None):
+    "Deterministic seed of the web number index, or of one of its stages"
+    key = "%d/%d" % (base_seed, index) if stage is None else "%d/%d/%s" % (base_seed, index, stage)
+    digest = hashlib.sha1(key.encode()).digest()
+    return int.from_bytes(digest[:4], 'little')
+
+
+def points_digest(points):
+    "Hash of the coordinates of the points, tells when the grease pencil strokes changed"
+    return hashlib.sha1(np.array([tuple(i) for i in points], dtype=np.float32).reshape(-1, 3).tobytes()).hexdigest()
+
+
+class StageCache:
+    """Least recently used results of the generation stages, so the redo panel only recomputes
+    what depends on the changed properties. Bounded by a number of entries, unless maxsize is None,
+    and with max_bytes by the estimated size of their arrays; the newest entry is always kept"""
+    def __init__(self, maxsize=128, max_bytes=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.sizes = {}
+        self.nbytes = 0
+
+    def get(self, key, default=None):
+        if key not in self.items:
+            return default
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def __setitem__(self, key, value):
+        self.nbytes -= self.sizes.pop(key, 0)
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if self.max_bytes is not None:
+            self.sizes[key] = estimated_nbytes(value)
+            self.nbytes += self.sizes[key]
+        while len(self.items) > 1 and ((self.maxsize is not None and len(self.items) > self.maxsize) or (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            old_key, old_value = self.items.popitem(last=False)
+            self.nbytes -= self.sizes.pop(old_key, 0)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def clear(self):
+        self.items.clear()
+        self.sizes.clear()
+        self.nbytes = 0
+
+
+def estimated_nbytes(value, seen=None):
+    "Memory taken by the NumPy arrays of a value, looking into containers and object attributes"
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(estimated_nbytes(i, seen) for i in value)
+    if isinstance(value, dict):
+        return sum(estimated_nbytes(i, seen) for i in value.values())
+    if hasattr(value, '__dict__') and not isinstance(value, type):
+        return estimated_nbytes(vars(value), seen)
+    return 0
+
+
+# webs and in memory atlases of the session, a few 4096 textures at most
+stage_cache = StageCache(maxsize=None, max_bytes=512 << 20)
+# grease points, ground heights, neighbourhoods, planes and hulls of the current grease pencil frame,
+# it is cleared with the frame so only the size of the neighbourhoods has to be bounded
+geometry_cache = StageCache(maxsize=None, max_bytes=128 << 20)
+_geometry_frame = None
+
+
+def memoized(digest, key, compute):
+    "compute() once for the points of this digest, without digest nothing is kept"
+    if digest is None:
+        return compute()
+    key = (digest,) + key
+    if key not in geometry_cache:
+        geometry_cache[key] = compute()
+    return geometry_cache.get(key)
+
+
 class Web:
-    def __init__(self, gravity_strength, draw=False, draw_2d=False, curve=False, anchor_points_candidates=[], size=1, density=1, ground=False, randomness=.2):
+    _vector_attributes = ('position', 'center', 'normal', 'plane_normal')
+
+    def __init__(self, gravity_strength, draw=False, draw_2d=False, curve=False, anchor_points_candidates=[], size=1, density=1, ground=False, randomness=.2, clock=None,
+                 anchors=None, detail='FULL', detail_seed=None, curve_tolerance=0., seed=None):
+        self.clock = Clock(verbose=False) if clock is None else clock
+        # every random draw of the web comes from its own generator
+        self.rng = make_rng(seed)
+        self.curve_tolerance = curve_tolerance
         self.density = density
         self.size = size
-        self.verts = []
+        self._verts = np.zeros((0, 3))
+        self.verts_count = 0
         self.threads = []
         self.frame_threads = []
         self.support_threads = []
         self.position = Vector((0, 0, 0))
         self.randomness = randomness
         self.object = None
-        if ground:
-            self.ground_z = detect_ground(anchor_points_candidates)
-        else:
-            self.ground_z = None
-        self.anchor_points, self.plane_normal = find_anchor_points(anchor_points_candidates, size=self.size, min_angle=pi / 16)
+        if anchors is None:
+            anchors = web_anchors(anchor_points_candidates, size, ground, self.clock, rng=self.rng)
+        self.anchor_points, self.plane_normal, self.ground_z = anchors
         self.center, self.normal = center_normal(self.anchor_points)
         self.position = self.center
         self.center_index = 0
@@ -324,10 +719,26 @@ class Web:
         self.gravity_strength = self.size * gravity_strength
 
         if len(self.anchor_points) > 2:
-            self.add_frame_threads(self.anchor_points)
-            self.add_support_threads(.3, self.size)
-            self.add_radial_threads(pi / (10 * self.density), self.randomness * self.size)
-            self.add_filling_threads(distance=size, randomness=self.randomness)
+            with self.clock.scope('add_frame_threads'):
+                self.add_frame_threads(self.anchor_points)
+            with self.clock.scope('add_support_threads'):
+                self.add_support_threads(.3, self.size)
+            with self.clock.scope('add_radial_threads'):
+                self.add_radial_threads(pi / (10 * self.density), self.randomness * self.size)
+            if detail == 'FULL':
+                self.add_detail(detail_seed)
+            else:
+                # proxy, only the radial threads get a few points to sag
+                with self.clock.scope('resolution_proxy'):
+                    self.resolution(3, [i for i in self.threads if i.thread_type == RADIAL], adaptative=False, tolerance=curve_tolerance)
+        # the threads are only edited while the web is built, then they are kept as arrays
+        self.threads = ThreadStore.from_threads(self.threads)
+
+        if len(self.anchor_points) > 2:
+            for code, count in enumerate(np.bincount(self.threads.types, minlength=len(THREAD_TYPES))):
+                if count:
+                    self.clock.count('threads_' + THREAD_TYPES[code], int(count))
+            self.clock.count('webs')
             if draw_2d:
                 self.draw_2d(1024)
                 self.draw_plane()
@@ -339,31 +750,116 @@ class Web:
                     self.convert_to_curve()
                     # self.smooth_hub()
 
+    @property
+    def verts(self):
+        return self._verts[:self.verts_count]
+
+    def add_verts(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        n = self.verts_count
+        needed = n + len(points)
+        if needed > len(self._verts):
+            verts = np.empty((max(needed, 2 * len(self._verts)), 3))
+            verts[:n] = self._verts[:n]
+            self._verts = verts
+        self._verts[n:needed] = points
+        self.verts_count = needed
+        self.clock.count('vertices', len(points))
+        return n
+
+    def curve_points(self, thread_type, index_a, index_c, t, random_vects=None, ground_z=None):
+        point_a, point_c = self.verts[index_a], self.verts[index_c]
+        point_b = curve_control_points(point_a, point_c, thread_type, np.asarray(self.position), self.gravity_strength, ground_z)
+        return bezier_points(point_a, point_b, point_c, t, random_vects)
+
+    def __getstate__(self):
+        # mathutils types can't be pickled, they travel as tuples between worker processes
+        state = self.__dict__.copy()
+        for name in self._vector_attributes:
+            state[name] = tuple(state[name])
+        state['anchor_points'] = [tuple(i) for i in state['anchor_points']]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name in self._vector_attributes:
+            setattr(self, name, Vector(state[name]))
+        self.anchor_points = [Vector(i) for i in state['anchor_points']]
+
     def add_frame_threads(self, anchor_points):
-        n = len(self.verts)
+        n = self.add_verts(anchor_points)
         for i in range(0, len(anchor_points)):
-            self.verts.append(anchor_points[i])
-            self.threads.append(Thread([n + i, (n + i + 1) % len(anchor_points)], thread_type='frame', web_parent=self))
+            self.threads.append(Thread([n + i, (n + i + 1) % len(anchor_points)], thread_type=FRAME, web_parent=self))
             self.frame_threads.append(i)
 
-    def resolution(self, resolution=5, threads=[], adaptative=False, randomness=0):
+    def resolution(self, resolution=5, threads=[], adaptative=False, randomness=0, tolerance=0):
+        """Adds points along the curves of the threads, resolution per segment or per unit of length when adaptative.
+        With a tolerance every segment gets just enough points for the chords to stay that close to its curve,
+        the points are then not jittered along the curve, which would move them away from the bound"""
+        with self.clock.scope('resolution'):
+            self._resolution(resolution, threads, adaptative, randomness, tolerance)
+
+    def _resolution(self, resolution, threads, adaptative, randomness, tolerance=0):
         default_res = resolution
-        for thread in threads:
+        n = self.verts_count
+        samples = {}
+        flatness = self.flatness_resolution(threads, tolerance) if tolerance > 0 else None
+        for k, thread in enumerate(threads):
             if adaptative:
-                length = (self.verts[thread.points[0]] - self.verts[thread.points[-1]]).length
+                length = np.linalg.norm(self.verts[thread.points[0]] - self.verts[thread.points[-1]])
                 resolution = int(length * default_res)
+            index_a, index_c, steps, resolutions, new_indexes = samples.setdefault(thread.thread_type, ([], [], [], [], []))
             new_thread_points = []
             for i in range(len(thread.points) - 1):
+                if flatness is not None:
+                    resolution = flatness[k][i]
                 new_points_indexes = [thread.points[i]]
                 for j in range(1, resolution):
-                    new_point = thread.position_on_curve(i, max(0, j + random() / 2 - .25) / resolution, randomness / resolution, ground_z=self.ground_z)
-                    n = len(self.verts)
-                    self.verts.append(new_point)
+                    index_a.append(thread.points[i])
+                    index_c.append(thread.points[i + 1])
+                    steps.append(j)
+                    resolutions.append(resolution)
+                    new_indexes.append(n)
                     new_points_indexes.append(n)
+                    n += 1
                 new_points_indexes.append(thread.points[i + 1])
                 new_thread_points.extend(new_points_indexes)
             thread.points = new_thread_points
 
+        new_verts = np.empty((n - self.verts_count, 3))
+        for thread_type, (index_a, index_c, steps, resolutions, new_indexes) in samples.items():
+            # the jitter of the positions and the offsets are drawn at once for all the points of the type
+            resolutions = np.array(resolutions, dtype=float)
+            jitter = 0 if tolerance > 0 else self.rng.uniform(-.25, .25, len(steps))
+            coefs = np.maximum(0, np.array(steps) + jitter) / resolutions
+            random_vects = None
+            if randomness > 0:
+                random_vects = self.rng.uniform(size=(len(steps), 3)) * (randomness / resolutions)[:, None]
+            new_points = self.curve_points(thread_type, index_a, index_c, np.array(coefs), random_vects, ground_z=self.ground_z)
+            new_verts[np.array(new_indexes, dtype=int) - self.verts_count] = new_points
+        self.add_verts(new_verts)
+
+    def flatness_resolution(self, threads, tolerance):
+        """Number of chords per segment of every thread keeping them within tolerance of the sagging curve.
+        A quadratic Bezier a, b, c is at most |a - 2b + c| / (4 k^2) away from its k uniform chords"""
+        resolutions = [[] for thread in threads]
+        by_type = OrderedDict()
+        for k, thread in enumerate(threads):
+            by_type.setdefault(thread.thread_type, []).append(k)
+        for thread_type, ks in by_type.items():
+            index_a = [i for k in ks for i in threads[k].points[:-1]]
+            index_c = [i for k in ks for i in threads[k].points[1:]]
+            if not index_a:
+                continue
+            point_a, point_c = self.verts[index_a], self.verts[index_c]
+            point_b = curve_control_points(point_a, point_c, thread_type, np.asarray(self.position), self.gravity_strength, self.ground_z)
+            deviation = np.linalg.norm(point_a - 2 * point_b + point_c, axis=1)
+            chords = np.maximum(1, np.ceil(np.sqrt(deviation / (4 * tolerance)))).astype(int)
+            splits = np.cumsum([len(threads[k].points) - 1 for k in ks])[:-1]
+            for k, thread_chords in zip(ks, np.split(chords, splits)):
+                resolutions[k] = thread_chords.tolist()
+        return resolutions
+
     def add_support_threads(self, reach_coef=.3, min_distance=.5):
         from_threads = self.threads
         new_indexes = [0]
@@ -378,15 +874,13 @@ class Web:
                 new_indexes.append(i)
             new_point_a = thread_a.position_on_curve(-2, 1 - reach_coef, ground_z=self.ground_z)
             new_point_b = thread_b.position_on_curve(0, reach_coef, ground_z=self.ground_z)
-            n = len(self.verts)
-            self.verts.append(new_point_a)
-            self.verts.append(new_point_b)
+            n = self.add_verts([new_point_a, new_point_b])
             thread_a.points.insert(-1, n)
             thread_b.points.insert(1, n + 1)
             threads_length = len(self.threads)
             new_indexes.append(threads_length)
             new_indexes.append(i + 1)
-            self.threads.append(Thread([n, n + 1], 'support', self))
+            self.threads.append(Thread([n, n + 1], SUPPORT, self))
             i += 1
 
         self.threads = [self.threads[i] for i in new_indexes]
@@ -394,22 +888,21 @@ class Web:
     def add_radial_threads(self, thread_angle, randomness=.2):
         curr_vect = Vector((0, 0, 1))
         new_threads = []
-        center_index = len(self.verts)
-        self.center_index = center_index
         center_coords = self.center + Vector((0, 0, -1)) * .6 * self.gravity_strength
         if self.ground_z is not None:
             center_coords.z = max(center_coords.z, self.ground_z)
         self.center = center_coords
-        self.verts.append(center_coords)
+        center_index = self.add_verts([center_coords])
+        self.center_index = center_index
         for thread in self.threads:
             draw_radial = True
-            if thread.thread_type == 'support':
+            if thread.thread_type == SUPPORT:
                 points = thread.to_vectors()
                 before_points = [thread.points[0]]
                 after_points = [thread.points[-1]]
                 position_index = 0
 
-            elif thread.thread_type == 'frame':
+            elif thread.thread_type == FRAME:
                 if len(thread.points) == 4:
                     points = thread.to_vectors()
                     points = [points[1], points[2]]
@@ -429,35 +922,41 @@ class Web:
                         angle_a, angle_b = angle_b, angle_a
                         thread.points.reverse()
                         points.reverse()
-                    coef_points = []
                     increment = thread_angle * thread_dist / thread_length
-                    coef = increment / 2
-                    while coef < 1:
-                        coef_points.append(coef)
-                        coef += ((1 - randomness) * 1 + randomness * (.5 + random())) * increment
+                    coef_points = jittered_positions(self.rng, increment / 2, increment, randomness)
 
                     new_points = [i for i in before_points]
 
-                    for coef in coef_points:
-                        new_point = thread.position_on_curve(position_index, coef, ground_z=self.ground_z)
-                        n = len(self.verts)
-                        self.verts.append(new_point)
-                        new_points.append(n)
-                        new_threads.append(Thread([center_index, n], 'radial', self))
-                        curr_vect = new_point - self.center
+                    if len(coef_points):
+                        index_a = [thread.points[position_index]] * len(coef_points)
+                        index_c = [thread.points[position_index + 1]] * len(coef_points)
+                        coords = self.curve_points(thread.thread_type, index_a, index_c, coef_points, ground_z=self.ground_z)
+                        n = self.add_verts(coords)
+                        for k in range(len(coef_points)):
+                            new_points.append(n + k)
+                            new_threads.append(Thread([center_index, n + k], RADIAL, self))
+                        curr_vect = Vector(coords[-1]) - self.center
                     new_points.extend(after_points)
                     thread.points = new_points
         self.threads.extend(new_threads)
 
+    def add_detail(self, detail_seed=None):
+        "Filling and hub threads of the full web, the random draws restart from detail_seed when it is given"
+        if detail_seed is not None:
+            self.rng = make_rng(detail_seed)
+        with self.clock.scope('add_filling_threads'):
+            self.add_filling_threads(distance=self.size, randomness=self.randomness)
+
     def add_filling_threads(self, probability=.95, distance=1, randomness=0):
-        self.resolution(30 * self.density / (1 + self.size), [i for i in self.threads if i.thread_type == 'radial'], adaptative=True, randomness=randomness)
+        self.resolution(30 * self.density / (1 + self.size), [i for i in self.threads if i.thread_type == RADIAL], adaptative=True, randomness=randomness)
         cond = False
         radial_beginning_index = -1
         center_indexes = []
         center_limits = []
+        max_link = .2*self.size/self.density
         while not cond:
             radial_beginning_index += 1
-            cond = self.threads[radial_beginning_index].thread_type == 'radial'
+            cond = self.threads[radial_beginning_index].thread_type == RADIAL
 
         n = len(self.threads)
 
@@ -470,36 +969,33 @@ class Web:
             next_thread = i + 1
             if next_thread == n - 1:
                 next_thread = radial_beginning_index
-            links = dict([(i, False) for i in self.threads[next_thread].points])
+            next_points = self.threads[next_thread].points
+            next_coords = self.verts[next_points]
+            next_keys, next_inverse = np.unique(np.array(next_points, dtype=int), return_inverse=True)
+            links = np.zeros(len(next_keys), dtype=bool)
+            tree = points_kdtree(next_coords)
+            center_distances = np.linalg.norm(self.verts[self.threads[i].points] - np.asarray(self.center), axis=1)
+            draws = self.rng.uniform(size=len(center_distances))
             for j, point_index in enumerate(self.threads[i].points):
                 used_proba = probability
-                if (self.verts[point_index] - self.center).length > distance:
+                if center_distances[j] > distance:
                     used_proba /= 10
-                if random() < used_proba:
-                    point = self.verts[point_index]
-                    dist = inf
-                    neighbour = point_index
-                    for new_point_index in self.threads[next_thread].points:
-                        new_point = self.verts[new_point_index]
-                        new_dist = (point - new_point).length
-                        if new_dist < dist and not links[new_point_index]:
-                            dist = new_dist
-                            neighbour = new_point_index
-                    thread_type = 'filling' if j > 0 else 'hub'
-                    if dist < .2*self.size/self.density:
-                        self.threads.append(Thread([point_index, neighbour], thread_type, self))
-                        links[neighbour] = True
+                if draws[j] < used_proba:
+                    k, dist = nearest_unlinked(tree, next_coords, links, next_inverse, self.verts[point_index], max_link)
+                    thread_type = FILLING if j > 0 else HUB
+                    if dist < max_link:
+                        self.threads.append(Thread([point_index, next_points[k]], thread_type, self))
+                        links[next_inverse[k]] = True
 
         center_indexes = list(set(center_indexes))
-        for point_index in center_indexes:
-            random_indexes = sample(range(len(center_limits)), min(2, len(center_limits)))
-            point_a, point_b = [self.verts[center_limits[i]] for i in random_indexes]
-            if len(center_limits) > 2:
-                index_a = randint(0, len(center_limits) - 1)
-                point_a = self.verts[center_limits[index_a]]
-                point_b = self.verts[center_limits[(index_a + len(center_limits) // 2) % len(center_limits)]]
-                factor = random()/2
-                self.verts[point_index] = factor * point_a + (.5 - factor) * point_b + .5 * self.verts[point_index]
+        if len(center_limits) > 2 and center_indexes:
+            # every hub point moves half way to a random point between two opposite limits of the hub
+            limits = np.array(center_limits)
+            index_a = self.rng.choice(len(limits), len(center_indexes))
+            point_a = self.verts[limits[index_a]]
+            point_b = self.verts[limits[(index_a + len(limits) // 2) % len(limits)]]
+            factor = self.rng.uniform(0, .5, (len(center_indexes), 1))
+            self.verts[center_indexes] = factor * point_a + (.5 - factor) * point_b + .5 * self.verts[center_indexes]
         hub_indexes = [i for i in center_indexes]
         center_indexes.extend(center_limits)
         links = {i: [] for i in center_indexes}
@@ -517,7 +1013,7 @@ class Web:
         #                         new_point_index in center_limits and point_index in center_limits):
         #                     dist = new_dist
         #                     neighbour = new_point_index
-        #         self.threads.append(Thread([point_index, neighbour], 'hub', self))
+        #         self.threads.append(Thread([point_index, neighbour], HUB, self))
         #         links[point_index].append(neighbour)
         #         try:
         #             links[neighbour].append(point_index)
@@ -525,48 +1021,53 @@ class Web:
         #             pass
 
         self.hub_indexes = center_indexes
-        self.resolution(5, [i for i in self.threads if i.thread_type == 'filling'], adaptative=False)
-        self.resolution(5, [i for i in self.threads if i.thread_type == 'hub'], adaptative=False)
+        self.resolution(5, [i for i in self.threads if i.thread_type == FILLING], adaptative=False, tolerance=self.curve_tolerance)
+        self.resolution(5, [i for i in self.threads if i.thread_type == HUB], adaptative=False, tolerance=self.curve_tolerance)
 
-    def get_edges(self, shift=0):
-        edges = []
-        for thread in self.threads:
-            if not (thread.thread_type == 'frame' and len(thread.points) == 2):
-                edges.extend(thread.to_edges())
-        if shift > 0:
-            edges = [(i[0] + shift, i[1] + shift) for i in edges]
-        return edges
+    def drawn_threads(self):
+        "The threads where the frame threads left without support are emptied"
+        return self.threads.masked(~((self.threads.types == FRAME) & (self.threads.counts() == 2)))
+
+    def get_edges(self, shift=0, as_array=False):
+        edges = self.drawn_threads().edges() + shift
+        if as_array:
+            return edges
+        return [tuple(i) for i in edges.tolist()]
 
     def get_threads_vects(self):
-        threads_vects = [[] for thread in self.threads]  # if not (thread.thread_type == 'frame' and len(thread.points) == 2)]
-        for i, thread in enumerate(self.threads):
-            if not (thread.thread_type == 'frame' and len(thread.points) == 2):
-                threads_vects[i] = [self.verts[j] for j in thread.points]
-        return threads_vects
+        threads = self.drawn_threads()
+        return threads.split(self.verts[threads.indexes])
+
+    def get_threads_indexes(self, shift=0):
+        threads = self.drawn_threads()
+        return threads.split(threads.indexes + shift)
 
     def get_edges_vect(self):
-        edges = self.get_edges(0)
-        edges_vect = [(self.verts[i[0]], self.verts[i[1]]) for i in edges]
-        return edges_vect
+        return [(Vector(a), Vector(b)) for a, b in self.get_edges_coords().tolist()]
+
+    def get_edges_coords(self):
+        return self.verts[self.get_edges(as_array=True)]
+
+    def get_edges_types(self):
+        "Thread type code of every edge, in the order of get_edges"
+        return self.drawn_threads().edges_types()
+
+    def get_edges_threads(self):
+        "Index of the thread of every edge, in the order of get_edges"
+        return self.drawn_threads().edges_threads()
 
     def draw_3d(self, break_proba=0):
         scene = bpy.context.scene
         if len(bpy.context.selected_objects) > 0:
             bpy.ops.object.delete(use_global=False)
 
-        edges = []
-        for thread in self.threads:
-            edges.extend(thread.to_edges())
-        new_edges = []
-        for i in edges:
-            if random() < (1 - break_proba):
-                new_edges.append(i)
-        edges = new_edges
+        edges = self.threads.edges()
+        if break_proba > 0:
+            edges = edges[self.rng.uniform(size=len(edges)) < 1 - break_proba]
 
         # self.verts = self.anchor_points
 
-        me = bpy.data.meshes.new("web")
-        me.from_pydata(self.verts, edges, [])
+        me = mesh_from_arrays("web", self.verts, edges)
         obj = bpy.data.objects.new("web", me)
         self.object = obj
         scene.objects.link(obj)
@@ -605,64 +1106,18 @@ class Web:
         bpy.context.scene.update()
 
     def draw_2d(self, res=1024):
-        normal = self.plane_normal
-        up = Vector((0, 0, 1))
-        quat = normal.rotation_difference(up)
-        points_2d = []
-        boundaries = [0, 0, 0, 0]
-        for point in self.verts:
-            new_point = point.copy()
-            new_point.rotate(quat)
-            # point.rotate(quat)
-            new_point.resize_2d()
-            points_2d.append(new_point)
-            x, y = new_point
-
-            if x < boundaries[0]:
-                boundaries[0] = x
-
-            if y < boundaries[1]:
-                boundaries[1] = y
-
-            if x > boundaries[2]:
-                boundaries[2] = x
-
-            if y > boundaries[3]:
-                boundaries[3] = y
-        scale = max(boundaries[2] - boundaries[0], boundaries[3] - boundaries[1])
-        # scale *= res/(res+1)
-        pos = Vector((boundaries[0], boundaries[1]))
-        uv_pos = []
-        self.uv_coords = uv_pos
-        for i, point in enumerate(points_2d):
-            point -= pos
-            point /= scale
-            if i < len(self.anchor_points):
-                uv_pos.append(point)
-
-        pixels = [(0, 0, 0, 0) for i in range(res ** 2)]
-        segments = []
+        points_2d, quat, pos, scale = points_to_uv_coords(self.verts, self.plane_normal)
+        self.uv_coords = [Vector(i) for i in points_2d[:len(self.anchor_points)]]
 
-        for thread in self.threads:
-            for i in range(len(thread.points) - 1):
-                segments.append((points_2d[thread.points[i]], points_2d[thread.points[i + 1]]))
-
-        for segment in segments:
-            p1, p2 = segment
-            x0, y0 = p1
-            x1, y1 = p2
-            x0 = int(x0 * res)
-            x1 = int(x1 * res)
-            y0 = int(y0 * res)
-            y1 = int(y1 * res)
-            draw_line(pixels, x0, y0, x1, y1, (1, 1, 1, 1), res)
+        edges = self.threads.edges()
+        pixels = np.zeros(res * res, dtype=np.float32)
+        draw_segments(pixels, points_2d[edges], res)
 
         if bpy.data.images.get('web1') is None or [i for i in bpy.data.images['web1'].size] != [res, res]:
             image = bpy.data.images.new("web1", width=res, height=res)
         else:
             image = bpy.data.images.get('web1')
-        pixels = [chan for px in pixels for chan in px]
-        image.pixels = pixels
+        upload_pixels(image, pixels)
         image.filepath_raw = "/tmp/temp.png"
         image.file_format = 'PNG'
         image.save()
@@ -695,16 +1150,249 @@ class Web:
         # obj.active_material = bpy.data.materials['wire']
 
 
+def curve_control_points(point_a, point_c, thread_type, position, gravity_strength, ground_z=None):
+    "Control points of the sagging quadratic Bezier curves going from point_a to point_c, for (M, 3) arrays"
+    middle = (point_a + point_c) / 2
+    length = np.linalg.norm(point_a - point_c, axis=1)[:, None]
+    down = np.array((0., 0., -1.))
+    if thread_type == FRAME:
+        point_b = middle + length * (position - middle) * 0.05
+        point_b += .2 * length * gravity_strength * down
+    elif thread_type == SUPPORT:
+        point_b = middle + length * (position - middle) * .4
+        point_b += .2 * length * gravity_strength * down
+    elif thread_type in (FILLING, HUB):
+        point_b = middle + .3 * length * gravity_strength * down
+    elif thread_type == RADIAL:
+        vect = point_a - point_c
+        vect_length = np.linalg.norm(vect, axis=1)
+        z = np.divide(vect[:, 2], vect_length, out=np.zeros(len(vect)), where=vect_length > 0)
+        z = .5 + z / 2
+        point_b = middle + .3 * gravity_strength * z[:, None] * down
+
+    if ground_z is not None:
+        point_b[:, 2] = np.maximum(point_b[:, 2], ground_z)
+    return point_b
+
+
+def bezier_points(point_a, point_b, point_c, t, random_vects=None):
+    "Quadratic Bezier evaluation, one t per row, random_vects offsets the control points relatively to the curves lengths"
+    t = t[:, None]
+    if random_vects is not None:
+        point_b = point_b + random_vects * np.linalg.norm(point_a - point_c, axis=1)[:, None]
+    return (1 - t) ** 2 * point_a + 2 * (1 - t) * t * point_b + t ** 2 * point_c
+
+
+def points_kdtree(points):
+    tree = kdtree.KDTree(len(points))
+    for i, co in enumerate(points):
+        tree.insert(co, i)
+    tree.balance()
+    return tree
+
+
+def cluster_planes(normals, centers, max_angle=pi / 12, max_distance=1.5):
+    """Groups the webs sharing a plane: a web joins the first group whose first web has a normal closer than max_angle
+    and a center closer than max_distance, or starts a new one. Lists of web indexes are returned.
+    The first centers of the groups are kept in a hash grid of max_distance cells, so only the neighbouring cells are checked"""
+    cells = {}
+    groups = []
+    for i, (normal, center) in enumerate(zip(normals, centers)):
+        cell = np.floor(np.asarray(center) / max_distance).astype(int)
+        best = None
+        for offset in NEIGHBOUR_CELLS:
+            for j in cells.get(tuple(cell + offset), ()):
+                first = groups[j][0]
+                if (best is None or j < best) and normals[first].angle(normal) < max_angle and (center - centers[first]).length < max_distance:
+                    best = j
+        if best is None:
+            cells.setdefault(tuple(cell), []).append(len(groups))
+            groups.append([i])
+        else:
+            groups[best].append(i)
+    return groups
+
+
+NEIGHBOUR_CELLS = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)])
+
+
+def points_array(points):
+    return np.array([tuple(i) for i in points], dtype=float).reshape(-1, 3)
+
+
+class PointGrid:
+    """Uniform grid of cubic cells over (N, 3) points, for radius queries that only look at the neighbouring cells.
+    The point indexes are sorted by cell so every cell, and every run of cells along z, is a slice"""
+    def __init__(self, points, cell_size):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.cell_size = float(cell_size)
+        cells = np.floor(self.points / self.cell_size).astype(np.int64)
+        self.origin = cells.min(axis=0) if len(cells) else np.zeros(3, dtype=np.int64)
+        cells -= self.origin
+        self.shape = tuple(cells.max(axis=0) + 1) if len(cells) else (1, 1, 1)
+        keys = np.ravel_multi_index(cells.T, self.shape) if len(cells) else np.zeros(0, dtype=np.int64)
+        self.order = np.argsort(keys, kind='mergesort')
+        self.keys = keys[self.order]
+
+    def query_radius(self, co, radius):
+        "Sorted indexes of the points closer than radius to co"
+        co = np.asarray(co, dtype=float)
+        low = np.maximum(np.floor((co - radius) / self.cell_size).astype(np.int64) - self.origin, 0)
+        high = np.minimum(np.floor((co + radius) / self.cell_size).astype(np.int64) - self.origin, np.array(self.shape) - 1)
+        if len(self.points) == 0 or np.any(low > high):
+            return np.zeros(0, dtype=np.int64)
+        x, y = np.meshgrid(np.arange(low[0], high[0] + 1), np.arange(low[1], high[1] + 1), indexing='ij')
+        first = np.ravel_multi_index((x.ravel(), y.ravel(), np.full(x.size, low[2])), self.shape)
+        last = first + (high[2] - low[2])
+        starts = np.searchsorted(self.keys, first, side='left')
+        ends = np.searchsorted(self.keys, last, side='right')
+        found = np.concatenate([self.order[a:b] for a, b in zip(starts, ends)])
+        found = found[np.linalg.norm(self.points[found] - co, axis=1) < radius]
+        return np.sort(found)
+
+
+def poisson_sites(points, spacing, rng, count=None):
+    """Indexes of points at least spacing apart, the points are tried in a random order until count sites are found.
+    The sites are kept in a hash grid of spacing cells so every point is only compared with the sites of its neighbouring cells"""
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    coords = points.tolist()
+    keys = np.floor(points / spacing).astype(np.int64).tolist()
+    offsets = NEIGHBOUR_CELLS.tolist()
+    squared = spacing * spacing
+    cells = {}
+    sites = []
+    for index in rng.choice(len(points), len(points), replace=False).tolist():
+        (x, y, z), (i, j, k) = coords[index], keys[index]
+        if any((x - a) ** 2 + (y - b) ** 2 + (z - c) ** 2 < squared
+               for di, dj, dk in offsets for a, b, c in cells.get((i + di, j + dj, k + dk), ())):
+            continue
+        cells.setdefault((i, j, k), []).append(coords[index])
+        sites.append(index)
+        if count is not None and len(sites) >= count:
+            break
+    return sites
+
+
+def nearest_unlinked(tree, points, links, inverse, co, max_distance):
+    """Index and distance of the closest point of the tree closer than max_distance and not linked yet, (None, inf) if none.
+    links flags the distinct points, inverse maps every point of the tree to its flag; only the found points are checked"""
+    # kdtree distances are single precision, the search radius is padded and the distances recomputed
+    found = [i for (_, i, _) in tree.find_range(co, max_distance * (1 + 1e-5) + 1e-7)]
+    if len(found) == 0:
+        return None, inf
+    found = np.array(sorted(found))
+    found = found[~links[inverse[found]]]
+    if len(found) == 0:
+        return None, inf
+    dists = np.linalg.norm(points[found] - co, axis=1)
+    k = np.argmin(dists)
+    return found[k], dists[k]
+
+
 class Clock:
-    def __init__(self):
+    """Nested timing scopes and counters.
+    Every finished scope is kept in events, totals() and counters can be queried after a run
+    and save_chrome_trace writes everything in the Chrome trace event format (chrome://tracing)"""
+    def __init__(self, verbose=True):
         self.clocks = {}
+        self.events = []
+        self.counters = {}
+        self.verbose = verbose
+        self.depth = 0
 
     def begin_clock(self, name):
-        self.clocks[name] = time.time()
+        self.clocks[name] = (time.perf_counter(), self.depth)
+        self.depth += 1
 
     def end_clock(self, name):
-        dt = time.time() - self.clocks.pop(name)
-        print(name, dt)
+        start, depth = self.clocks.pop(name)
+        dt = time.perf_counter() - start
+        self.depth = depth
+        self.events.append({'name': name, 'start': start, 'duration': dt, 'depth': depth, 'pid': os.getpid()})
+        if self.verbose and depth == 0:
+            print(name, dt)
+        return dt
+
+    @contextmanager
+    def scope(self, name):
+        self.begin_clock(name)
+        try:
+            yield self
+        finally:
+            self.end_clock(name)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other):
+        "Adds the events and counters of a clock from another process, as if they happened in the current scope"
+        for event in other.events:
+            event = dict(event, depth=event['depth'] + self.depth)
+            self.events.append(event)
+        for name, value in other.counters.items():
+            self.count(name, value)
+
+    def totals(self):
+        "{scope name: (number of calls, total time)}"
+        totals = {}
+        for event in self.events:
+            calls, duration = totals.get(event['name'], (0, 0))
+            totals[event['name']] = (calls + 1, duration + event['duration'])
+        return totals
+
+    def report(self):
+        lines = ["%-24s %6d calls %10.4fs" % (name, calls, duration)
+                 for name, (calls, duration) in sorted(self.totals().items(), key=lambda i: -i[1][1])]
+        lines.extend("%-24s %d" % (name, value) for name, value in sorted(self.counters.items()))
+        return "\n".join(lines)
+
+    def save_chrome_trace(self, path):
+        origin = min([event['start'] for event in self.events] or [0])
+        end = max([event['start'] + event['duration'] for event in self.events] or [0])
+        trace = [{'name': event['name'], 'ph': 'X', 'ts': (event['start'] - origin) * 1e6, 'dur': event['duration'] * 1e6,
+                  'pid': event['pid'], 'tid': event['pid']} for event in self.events]
+        trace.extend({'name': name, 'ph': 'C', 'ts': (end - origin) * 1e6, 'pid': os.getpid(), 'args': {name: value}}
+                     for name, value in sorted(self.counters.items()))
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+
+def mesh_from_arrays(name, verts, edges):
+    "Loose edges mesh filled with foreach_set from (N, 3) verts and (E, 2) edges arrays"
+    me = bpy.data.meshes.new(name)
+    me.vertices.add(len(verts))
+    me.vertices.foreach_set('co', np.asarray(verts, dtype=np.float32).ravel())
+    me.edges.add(len(edges))
+    me.edges.foreach_set('vertices', np.asarray(edges, dtype=np.int32).ravel())
+    me.update()
+    return me
+
+
+def chain_polylines(polylines, types):
+    "Joins the polylines of the same type that share an end point, returns the list of chained polylines"
+    chains = []
+    ends = {}
+    for points, thread_type in zip(polylines, types):
+        points = list(points)
+        chain = ends.get((thread_type, points[0]))
+        if chain is None:
+            chain = ends.get((thread_type, points[-1]))
+            if chain is not None:
+                points.reverse()
+        if chain is None:
+            chain = points
+            chains.append(chain)
+        else:
+            ends.pop((thread_type, chain[0]), None)
+            ends.pop((thread_type, chain[-1]), None)
+            if chain[-1] == points[0]:
+                chain.extend(points[1:])
+            else:
+                chain[:0] = points[:0:-1]
+        if chain[0] != chain[-1]:
+            ends[(thread_type, chain[0])] = chain
+            ends[(thread_type, chain[-1])] = chain
+    return chains
 
 
 def draw_point(pixels, x, y, color, alpha, res, res_x):
@@ -774,6 +1462,264 @@ def draw_line(pixels, x0, y0, x1, y1, color, res, res_x=None):
         draw_point(pixels, x, y, color, 1, res, res_x)
 
 
+def draw_segments(pixels, segments, res, res_x=None, offset=0, blend='legacy'):
+    """Vectorized version of draw_line for an (M, 2, 2) array of segments in uv coordinates.
+    blend='legacy' gives the same result as draw_line, blend='add' sums and clamps the samples instead"""
+    if res_x is None:
+        res_x = res
+    segments = np.asarray(segments).reshape(-1, 2, 2)
+    x0, y0, x1, y1 = (np.trunc(segments.reshape(-1, 4) * res).astype(np.int64) + (offset, 0, offset, 0)).T
+    x, y, alpha = line_samples(x0, y0, x1, y1)
+    y = res - y
+    coords = np.minimum(y * res_x + x, res * res_x - 1)
+    coords[coords < 0] += res * res_x
+    if blend == 'legacy':
+        # each sample does p += (1 - p) / 2 * alpha, ie. 1 - p is multiplied by 1 - alpha / 2, whatever the order
+        transparency = np.exp(np.bincount(coords, weights=np.log1p(-alpha / 2), minlength=len(pixels)))
+        pixels[:] = 1 - (1 - pixels) * transparency
+    else:
+        pixels[:] = np.minimum(pixels + np.bincount(coords, weights=alpha, minlength=len(pixels)), 1)
+    return pixels
+
+
+def upload_pixels(image, pixels):
+    "Writes a flat single channel raster as grey and alpha in the image, in one call"
+    rgba = np.empty((len(pixels), 4), dtype=np.float32)
+    rgba[:] = np.asarray(pixels, dtype=np.float32)[:, None]
+    if hasattr(image.pixels, 'foreach_set'):
+        image.pixels.foreach_set(rgba.ravel())
+    else:
+        # arrays have no foreach_set before blender 2.83
+        image.pixels[:] = rgba.ravel()
+
+
+def pack_tiles(sizes):
+    """Shelf packing of square tiles, the biggest first, in the smallest power of two atlas, the squarest on ties.
+    Returns the (x, y) corner of every tile, y being the row from the bottom, and the atlas width and height"""
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i])
+    best = None
+    width = power_of_two(max(sizes))
+    while True:
+        corners = [None] * len(sizes)
+        x = y = shelf = 0
+        for i in order:
+            if x + sizes[i] > width:
+                x, y, shelf = 0, y + shelf, 0
+            corners[i] = (x, y)
+            x += sizes[i]
+            shelf = max(shelf, sizes[i])
+        height = power_of_two(y + shelf)
+        key = (width * height, max(width, height) // min(width, height))
+        if best is None or key < best[0]:
+            best = key, corners, width, height
+        if width >= sum(sizes):
+            return best[1:]
+        width *= 2
+
+
+def power_of_two(n):
+    return 1 << max(0, int(n) - 1).bit_length()
+
+
+def render_tile(segments, res, widths=None, strands=None):
+    """(res, res) float32 coverage of the uv segments of one plane, rows from the bottom like image.pixels.
+    With widths, the segments are drawn as strands of these pixel widths by draw_segments_coverage"""
+    tile = np.zeros(res * res, dtype=np.float32)
+    if widths is None:
+        draw_segments(tile, segments, res)
+    else:
+        draw_segments_coverage(tile, segments, widths, res, strands=strands)
+    return tile.reshape(res, res)
+
+
+# strand widths in pixels, scaled by the strand_width of the operator
+THREAD_WIDTHS = {
+    'frame': 2.,
+    'support': 1.5,
+    'radial': 1.2,
+    'filling': .8,
+    'hub': .8,
+}
+
+
+def thread_widths(types, scale=1., mapping=None):
+    "Pixel widths of the thread type codes, from mapping by type name or THREAD_WIDTHS"
+    mapping = THREAD_WIDTHS if mapping is None else mapping
+    widths = np.array([mapping.get(name, 1.) for name in THREAD_TYPES])
+    return widths[np.asarray(types, dtype=int)] * scale
+
+
+def draw_segments_coverage(pixels, segments, widths, res, res_x=None, offset=0, strands=None, max_length=4, batch=1 << 18):
+    """Paints the (M, 2, 2) uv segments as strands of the given pixel widths.
+    Every pixel gets the coverage across the strand times the coverage along it, a separable estimate of the covered area
+    that is off by a few percent at caps and crossings. strands numbers the polyline of every segment,
+    consecutive segments of a strand add up on a pixel while different strands are combined with max.
+    Segments are split in pieces of at most max_length pixels so each piece only looks at a small square of pixels"""
+    if res_x is None:
+        res_x = res
+    segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    widths = np.broadcast_to(np.asarray(widths, dtype=float), (len(segments),))
+    if len(segments) == 0:
+        return pixels
+    strands = np.arange(len(segments)) if strands is None else np.asarray(strands)
+    # uv to pixel space, rows go down as v goes up like in draw_segments
+    ends = np.empty_like(segments)
+    ends[:, :, 0] = segments[:, :, 0] * res + offset
+    ends[:, :, 1] = (1 - segments[:, :, 1]) * res
+    vects = ends[:, 1] - ends[:, 0]
+    lengths = np.linalg.norm(vects, axis=1)
+    pieces = np.maximum(1, np.ceil(lengths / max_length)).astype(int)
+    tangents = np.where(lengths[:, None] > 1e-12, vects / np.maximum(lengths, 1e-12)[:, None], (1., 0.))
+    size = int(np.ceil(max_length + widths.max())) + 3
+    dx, dy = np.mgrid[0:size, 0:size].reshape(2, 1, -1)
+
+    # batches of whole strands, so all their pieces are summed together
+    strand_starts = np.flatnonzero(np.concatenate(([True], strands[1:] != strands[:-1])))
+    piece_starts = np.concatenate(([0], np.cumsum(pieces)))
+    limit = max(1, batch // (size * size))
+    cuts = strand_starts[np.searchsorted(piece_starts[strand_starts], np.arange(0, piece_starts[-1], limit), side='right') - 1]
+    cuts = np.unique(np.concatenate((cuts, [len(segments)])))
+    for first, last in zip(cuts[:-1], cuts[1:]):
+        count = pieces[first:last]
+        segment = np.repeat(np.arange(first, last), count)
+        index = np.arange(len(segment)) - np.repeat(np.cumsum(count) - count, count)
+        length = lengths[segment] / pieces[segment]
+        a = ends[segment, 0] + tangents[segment] * (index * length)[:, None]
+        e = tangents[segment]
+        half = widths[segment, None] / 2
+        corner = np.floor(np.minimum(a, a + e * length[:, None]) - half - 1).astype(np.int64)
+        x, y = corner[:, 0, None] + dx[0], corner[:, 1, None] + dy[0]
+        # distances of the pixel centers across and along the piece
+        px, py = x + .5 - a[:, 0, None], y + .5 - a[:, 1, None]
+        across = px * -e[:, 1, None] + py * e[:, 0, None]
+        along = px * e[:, 0, None] + py * e[:, 1, None]
+        # a pixel reaches at most sqrt(2) / 2 from its center, only the ones that can touch the piece are evaluated
+        near = ((np.abs(across) < half + .71) & (along > -.71) & (along < length[:, None] + .71) &
+                (x >= offset) & (x < offset + res) & (y >= 0) & (y < res))
+        if not near.any():
+            continue
+        shape = x.shape
+        lo = np.broadcast_to(np.minimum(np.abs(e[:, 0]), np.abs(e[:, 1]))[:, None], shape)[near]
+        hi = np.broadcast_to(np.maximum(np.abs(e[:, 0]), np.abs(e[:, 1]))[:, None], shape)[near]
+        half = np.broadcast_to(half, shape)[near]
+        length = np.broadcast_to(length[:, None], shape)[near]
+        across, along = across[near], along[near]
+        coverage = ((pixel_area_below(half - across, lo, hi) - pixel_area_below(-half - across, lo, hi)) *
+                    (pixel_area_below(length - along, lo, hi) - pixel_area_below(-along, lo, hi)))
+        strand = np.broadcast_to(strands[segment][:, None], shape)[near]
+        coords = (y * res_x + x)[near]
+        inside = coverage > 1e-6
+        coords, strand, coverage = coords[inside], strand[inside], coverage[inside]
+        if len(coords) == 0:
+            continue
+        order = np.lexsort((strand, coords))
+        coords, strand, coverage = coords[order], strand[order], coverage[order]
+        # sum the pieces of each strand on a pixel, then keep the max of the strands
+        firsts = np.flatnonzero(np.concatenate(([True], (coords[1:] != coords[:-1]) | (strand[1:] != strand[:-1]))))
+        coverage = np.add.reduceat(coverage, firsts)
+        coords = coords[firsts]
+        firsts = np.flatnonzero(np.concatenate(([True], coords[1:] != coords[:-1])))
+        coords = coords[firsts]
+        pixels[coords] = np.maximum(pixels[coords], np.minimum(np.maximum.reduceat(coverage, firsts), 1))
+    return pixels
+
+
+def pixel_area_below(t, lo, hi):
+    """Area of a unit pixel centered on the origin where n.p < t, for a unit n of absolute coordinates lo <= hi.
+    The projection of the square on n is a trapezoid, its integral is quadratic on the sides and linear in the middle"""
+    lo = np.maximum(lo, 1e-9)
+    u = np.minimum(t, -t) + (lo + hi) / 2
+    area = np.clip(u, 0, lo) ** 2 / (2 * lo * hi) + np.maximum(u - lo, 0) / hi
+    return np.where(t < 0, area, 1 - area)
+
+
+def save_exr_tile(tile, path):
+    "Saves a (res, res) tile as a float exr through a temporary blender image"
+    res_y, res_x = tile.shape
+    image = bpy.data.images.new("web_tile", width=res_x, height=res_y, alpha=True, float_buffer=True)
+    upload_pixels(image, tile.ravel())
+    image.filepath_raw = path
+    image.file_format = 'OPEN_EXR'
+    image.save()
+    image.user_clear()
+    bpy.data.images.remove(image)
+
+
+def png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff)
+
+
+def write_png(path, rows, width, height, channels=4, bit_depth=8, chunk_size=1 << 20):
+    """Streams rows of width * channels integers, top row first, into a png file.
+    Only one row and one compressed chunk are kept in memory"""
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+    dtype = '>u2' if bit_depth == 16 else 'u1'
+    compressor = zlib.compressobj(6)
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, 0)))
+        data = b''
+        for row in rows:
+            # filter type 0, the samples as they are
+            data += compressor.compress(b'\x00' + np.asarray(row).astype(dtype).tobytes())
+            if len(data) >= chunk_size:
+                f.write(png_chunk(b'IDAT', data))
+                data = b''
+        data += compressor.flush()
+        f.write(png_chunk(b'IDAT', data))
+        f.write(png_chunk(b'IEND', b''))
+
+
+def jittered_positions(rng, start, increment, randomness, stop=1.):
+    "Positions from start to stop spaced by increment, every step jittered by randomness, the steps are drawn in batches"
+    positions = [np.zeros(0)]
+    while start < stop:
+        steps = ((1 - randomness) + randomness * (.5 + rng.uniform(size=int((stop - start) / increment) + 2))) * increment
+        batch = start + np.concatenate(([0], np.cumsum(steps[:-1])))
+        positions.append(batch[batch < stop])
+        start = batch[-1] + steps[-1]
+    return np.concatenate(positions)
+
+
+def line_samples(x0, y0, x1, y1):
+    "Pixels and weights draw_line would paint for each of the integer segments, as flat x, y, alpha arrays"
+    dx, dy = np.abs(x1 - x0), np.abs(y1 - y0)
+    sx = np.where(x0 > x1, -1, 1)
+    sy = np.where(y0 > y1, -1, 1)
+    steep = dx <= dy
+    # walking along the major axis, the minor axis moves each time Bresenham's error goes below 0
+    major, minor = np.where(steep, dy, dx), np.where(steep, dx, dy)
+    s_major, s_minor = np.where(steep, sy, sx), np.where(steep, sx, sy)
+    start_major, start_minor = np.where(steep, y0, x0), np.where(steep, x0, y0)
+    grad = np.where(major == 0, 1, minor / np.maximum(major, 1))
+
+    segment = np.repeat(np.arange(len(x0)), major)
+    k = np.arange(len(segment)) - np.repeat(np.cumsum(major) - major, major)
+    numerator = 2 * k * minor[segment] - major[segment]
+    steps = -(-numerator // (2 * major[segment]))
+    along = start_major[segment] + k * s_major[segment]
+    across = start_minor[segment] + steps * s_minor[segment]
+    error = start_minor[segment] + k * grad[segment] * s_minor[segment] - across
+    side = np.sign(error).astype(np.int64)
+    error = np.abs(error)
+
+    along = np.concatenate((along, along))
+    across = np.concatenate((across + side, across))
+    alpha = np.concatenate((error, 1 - error))
+    is_steep = np.concatenate((steep[segment], steep[segment]))
+
+    # steep lines end with their last pixel
+    last = np.flatnonzero(steep)
+    along = np.concatenate((along, y1[last]))
+    across = np.concatenate((across, x1[last]))
+    alpha = np.concatenate((alpha, np.ones(len(last))))
+    is_steep = np.concatenate((is_steep, np.ones(len(last), dtype=bool)))
+
+    x = np.where(is_steep, across, along)
+    y = np.where(is_steep, along, across)
+    return x, y, alpha
+
+
 def sign(x):
     return 1 if x > 0 else -1 if x < 0 else 0
 
@@ -799,14 +1745,16 @@ def web_hull(points, center):
     return new_points
 
 
-def simple_polygon(vertices=5, randomness=.1):
+def simple_polygon(vertices=5, randomness=.1, rng=None):
+    rng = make_rng() if rng is None else rng
     vector = Vector((1, 0, 0))
     new_points = []
     M = Matrix.Rotation(-2 * pi / vertices, 4, 'Y')
     N = Matrix.Rotation(pi / 4, 4, 'X')
+    factors = (1 - randomness) + randomness * (.5 - rng.uniform(size=vertices))
     for i in range(vertices):
         M = Matrix.Rotation(-2 * pi / vertices, 4, 'Y')
-        new_points.append(((1 - randomness) + randomness * (.5 - random())) * vector)
+        new_points.append(float(factors[i]) * vector)
         vector = M * vector
     return [N * i for i in new_points]
 
@@ -831,16 +1779,37 @@ def center_normal(points):
 
 
 def get_grease_points():
-    points = []
-    gp = bpy.context.scene.grease_pencil
-    if gp is not None and gp.layers.active is not None and gp.layers.active.active_frame is not None and len(gp.layers.active.active_frame.strokes) > 0:
-        for stroke in gp.layers.active.active_frame.strokes:
-            points.extend([i.co.copy() for i in stroke.points.values()])
-    return points
+    return read_grease_points()[0]
 
 
-def find_anchor_points(points, size, min_angle=2 * pi / 8, max_distance=3):
-    points, plane_normal = setup_anchors(points, size, size*2)
+def read_grease_points():
+    """Points of the active grease pencil frame and their digest.
+    The coordinates are read in bulk, the Vectors are only created when the strokes changed"""
+    global _geometry_frame
+    gp = bpy.context.scene.grease_pencil
+    coords = [np.zeros(0, dtype=np.float32)]
+    frame = None
+    if gp is not None and gp.layers.active is not None and gp.layers.active.active_frame is not None and len(gp.layers.active.active_frame.strokes) > 0:
+        layer = gp.layers.active
+        frame = (gp.name, layer.info, layer.active_frame.frame_number)
+        for stroke in layer.active_frame.strokes:
+            stroke_coords = np.empty(len(stroke.points) * 3, dtype=np.float32)
+            stroke.points.foreach_get('co', stroke_coords)
+            coords.append(stroke_coords)
+    coords = np.concatenate(coords).reshape(-1, 3)
+    digest = hashlib.sha1(coords.tobytes()).hexdigest()
+    if frame != _geometry_frame:
+        geometry_cache.clear()
+        _geometry_frame = frame
+    points = memoized(digest, ('points',), lambda: [Vector(i) for i in coords.tolist()])
+    return list(points), digest
+
+
+def find_anchor_points(points, size, min_angle=2 * pi / 8, max_distance=3, clock=None, digest=None, grid=None, rng=None, starts=None):
+    if clock is None:
+        clock = Clock(verbose=False)
+    with clock.scope('setup_anchors'):
+        points, plane_normal = setup_anchors(points, size, size*2, digest, grid=grid, rng=rng, starts=starts)
     center = Vector((0, 0, 0))
     for i in points:
         center += i
@@ -855,108 +1824,98 @@ def find_anchor_points(points, size, min_angle=2 * pi / 8, max_distance=3):
 
 
 def get_plane_from_points(points):
-    locs = [i for i in points]
-
-    com = Vector((0, 0, 0))
-    for loc in locs:
-        com += loc
-    com /= len(locs)
-    x, y, z = com
-
-    mat = Matrix([[0, 0, 0], [0, 0, 0], [0, 0, 0]])
-    for loc in locs:
-        mat[0][0] += (loc[0] - x) ** 2
-        mat[0][1] += (loc[0] - x) * (loc[1] - y)
-        mat[0][2] += (loc[0] - x) * (loc[2] - z)
-        mat[1][0] += (loc[1] - y) * (loc[0] - x)
-        mat[1][1] += (loc[1] - y) ** 2
-        mat[1][2] += (loc[1] - y) * (loc[2] - z)
-        mat[2][0] += (loc[2] - z) * (loc[0] - x)
-        mat[2][1] += (loc[2] - z) * (loc[1] - y)
-        mat[2][2] += (loc[2] - z) ** 2
-
-    mat.invert()
-    itermax = 500
-    iter = 0
-    vec = Vector((1, 1, 1))
-    vec2 = (vec * mat) / (vec * mat).length
-    while vec != vec2 and iter < itermax:
-        iter += 1
-        vec = vec2
-        vec2 = (vec * mat) / (vec * mat).length
-    normal = vec2
-
-    return com, normal
-
-
-def setup_anchors(points, size, max_distance=3):
-    n = len(points)
-    neighbours_length = 0
-
-    tries = 0
-    while neighbours_length < 20 and tries < 5:
-        random_start_point = points[randint(0, len(points)-1)]
-        neighbours = [p for p in points if (p-random_start_point).length < max_distance]
-        neighbours_length = len(neighbours)
-        tries += 1
-    if tries < 5:
-        random_indices = sample([i for i in range(len(neighbours))], 20)
-        random_selection = [neighbours[i] for i in random_indices]
-        plane_co, plane_normal = get_plane_from_points(random_selection)
-        new_points = []
-        barycenter = Vector()
-        shuffle(points)
-        for i, point in enumerate(neighbours):
-            barycenter += point
-            if (point - barycenter / (i + 1)).length < max_distance and abs(geometry.distance_point_to_plane(point, plane_co, plane_normal)) < .6 * size:
-                new_points.append(point)
-
-        new_points = convex_indexing(new_points, plane_normal)
-        return new_points, plane_normal
-
-    else:
+    centers, normals, eigenvalues = fit_planes(np.array([tuple(i) for i in points]))
+    return Vector(centers[0]), Vector(normals[0])
+
+
+def fit_planes(points, offsets=(0,)):
+    """Least squares planes of consecutive groups of points, starting at the offsets like np.add.reduceat.
+    Returns the (M, 3) centers, the (M, 3) unit normals and the (M, 3) ascending eigenvalues of the covariances,
+    the first one is the mean squared distance to the plane. Normals point towards (1, 1, 1)"""
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    offsets = np.asarray(offsets, dtype=int)
+    counts = np.diff(np.append(offsets, len(points)))
+    centers = np.add.reduceat(points, offsets, axis=0) / counts[:, None]
+    centered = points - np.repeat(centers, counts, axis=0)
+    products = (centered[:, :, None] * centered[:, None, :]).reshape(-1, 9)
+    covariances = np.add.reduceat(products, offsets, axis=0).reshape(-1, 3, 3) / counts[:, None, None]
+    eigenvalues, eigenvectors = np.linalg.eigh(covariances)
+    normals = eigenvectors[:, :, 0]
+    normals[normals.sum(axis=1) < 0] *= -1
+    return centers, normals, eigenvalues
+
+
+# fewest candidates around a start point to fit the plane of a web on
+MIN_NEIGHBOURS = 20
+
+
+def setup_anchors(points, size, max_distance=3, digest=None, tries=5, grid=None, rng=None, starts=None):
+    """Fits a plane on the neighbourhood of a few random start points, or of the given starts, at once and keeps the flattest one,
+    the anchors are the convex hull of its neighbours close to the plane.
+    The grid is a PointGrid of the points with cells of max_distance, built here when not given.
+    With the digest of the points, neighbourhoods, planes and hulls are memoized in geometry_cache"""
+    if len(points) == 0:
         return [], Vector()
+    if grid is None:
+        grid = memoized(digest, ('grid', max_distance), lambda: PointGrid(points_array(points), max_distance))
+    coords = grid.points
+    if starts is None:
+        rng = make_rng() if rng is None else rng
+        starts = rng.choice(len(points), tries).tolist()
+    neighbourhoods = []
+    for start in starts:
+        neighbours = memoized(digest, ('neighbours', start, max_distance), lambda: grid.query_radius(coords[start], max_distance))
+        if len(neighbours) >= MIN_NEIGHBOURS:
+            neighbourhoods.append((start, neighbours))
+    if not neighbourhoods:
+        return [], Vector()
+
+    def best_plane():
+        offsets = np.cumsum([0] + [len(neighbours) for start, neighbours in neighbourhoods[:-1]])
+        centers, normals, eigenvalues = fit_planes(coords[np.concatenate([n for s, n in neighbourhoods])], offsets)
+        best = int(np.argmin(eigenvalues[:, 0] / np.maximum(eigenvalues[:, 1], 1e-12)))
+        return best, centers[best], normals[best]
+
+    best, plane_co, plane_normal = memoized(digest, ('plane', max_distance, tuple(s for s, n in neighbourhoods)), best_plane)
+    start, neighbours = neighbourhoods[best]
+
+    def anchors_hull():
+        neighbours_coords = coords[neighbours]
+        barycenters = np.cumsum(neighbours_coords, axis=0) / np.arange(1, len(neighbours) + 1)[:, None]
+        near = np.linalg.norm(neighbours_coords - barycenters, axis=1) < max_distance
+        flat = np.abs((neighbours_coords - plane_co).dot(plane_normal)) < .6 * size
+        kept = neighbours[near & flat]
+        return [points[kept[i]] for i in convex_hull_indexes(coords[kept], Vector(plane_normal))]
+
+    new_points = memoized(digest, ('hull', size, max_distance, start), anchors_hull)
+    return list(new_points), Vector(plane_normal)
 
 
 def convex_indexing(points, direction):
-    new_points = [i.copy() for i in points]
+    convex_indices = convex_hull_indexes(points_array(points), direction)
+    return [points[i] for i in convex_indices]
+
+
+def convex_hull_indexes(coords, direction):
+    "Indexes of the convex hull of the (N, 3) coords seen along direction"
     up = Vector((0, 0, 1))
     quat = direction.rotation_difference(up)
-    for point in new_points:
-        point.rotate(quat)
-        point.resize_2d()
-    convex_indices = geometry.convex_hull_2d(new_points)
-    return [points[i] for i in convex_indices]
+    points_2d = np.asarray(coords, dtype=float).reshape(-1, 3).dot(np.array(quat.to_matrix()).T)[:, :2]
+    return geometry.convex_hull_2d(points_2d.tolist())
 
 
 def points_to_uv_coords(points, normal):
+    "Projects an (N, 3) array of points on the plane, returns the (N, 2) uv coordinates and the transformation used"
     up = Vector((0, 0, 1))
     quat = normal.rotation_difference(up)
-    points_2d = []
+    points_2d = np.asarray(points, dtype=float).reshape(-1, 3).dot(np.array(quat.to_matrix()).T)[:, :2]
     boundaries = [0, 0, 0, 0]
-    for point in points:
-        new_point = point.copy()
-        new_point.rotate(quat)
-        new_point.resize_2d()
-        points_2d.append(new_point)
-        x, y = new_point
-
-        if x < boundaries[0]:
-            boundaries[0] = x
-
-        if y < boundaries[1]:
-            boundaries[1] = y
-
-        if x > boundaries[2]:
-            boundaries[2] = x
-
-        if y > boundaries[3]:
-            boundaries[3] = y
+    if len(points_2d) > 0:
+        boundaries[0], boundaries[1] = np.minimum(points_2d.min(axis=0), 0)
+        boundaries[2], boundaries[3] = np.maximum(points_2d.max(axis=0), 0)
     scale = max(boundaries[2] - boundaries[0], boundaries[3] - boundaries[1])
     pos = Vector((boundaries[0], boundaries[1]))
-    for i, point in enumerate(points_2d):
-        point -= pos
-        point /= scale
+    points_2d = (points_2d - np.asarray(pos)) / scale
 
     return points_2d, quat, pos, scale
 
@@ -989,5 +1948,130 @@ def unregister():
     bpy.types.VIEW3D_PT_tools_object.remove(menu_func)
 
 
+def read_mesh_points(objects):
+    "World coordinates of the vertices of the mesh objects, as (N, 3) anchor candidates"
+    coords = [np.zeros((0, 3))]
+    for obj in objects:
+        if obj.type != 'MESH':
+            continue
+        co = np.empty(len(obj.data.vertices) * 3, dtype=np.float32)
+        obj.data.vertices.foreach_get('co', co)
+        matrix = np.array(obj.matrix_world)
+        coords.append(co.reshape(-1, 3).dot(matrix[:3, :3].T) + matrix[:3, 3])
+    return np.concatenate(coords)
+
+
+def read_points_file(path):
+    "(N, 3) anchor candidates of a .npy file, or of the first three columns of a text file (.xyz, .txt, .csv)"
+    if path.endswith('.npy'):
+        points = np.load(path)
+    else:
+        points = np.loadtxt(path, delimiter=',' if path.endswith('.csv') else None, ndmin=2)
+    return np.asarray(points, dtype=float)[:, :3]
+
+
+def build_web_set(job):
+    "Webs of one set of the batch mode built in a worker process without drawing them, with the keys Webs looks them up by"
+    points, sweep_seed, settings = job
+    webs = Webs(seed=sweep_seed, points=points, **settings)
+    return list(zip(webs.web_keys, webs.webs))
+
+
+def batch_main(argv):
+    """Generates a library of webs without the interface, one set of webs per seed:
+
+        blender -b scene.blend --python spiderwebs.py -- --seeds 0 100 --output webs.blend
+
+    The anchor candidates come from --points files or from the grease pencil of the opened .blend,
+    the curves, meshes and planes are written to --output and the textures to --texture-dir"""
+    parser = argparse.ArgumentParser(prog="spiderwebs.py", description="Generates spider webs without the interface")
+    parser.add_argument('--points', nargs='+', default=[], help="anchor candidates, .npy or .xyz files, instead of the grease pencil")
+    parser.add_argument('--grease-pencil', help="grease pencil datablock to read instead of the one of the scene")
+    parser.add_argument('--seeds', nargs=2, type=int, default=(0, 1), metavar=('FIRST', 'COUNT'))
+    parser.add_argument('--output', required=True, help=".blend file the webs are written to")
+    parser.add_argument('--texture-dir', help="folder of the textures, one sub folder per set of webs")
+    parser.add_argument('--size', type=float, default=1)
+    parser.add_argument('--density', type=float, default=1)
+    parser.add_argument('--randomness', type=float, default=.2)
+    parser.add_argument('--gravity', type=float, default=1)
+    parser.add_argument('--number', type=int, default=1, help="webs per set")
+    parser.add_argument('--no-floor', action='store_true', help="don't detect the floor")
+    parser.add_argument('--curves', action='store_true', help="write the threads as curves")
+    parser.add_argument('--meshes', action='store_true', help="write the threads as meshes")
+    parser.add_argument('--texture-size', type=int, default=1024)
+    parser.add_argument('--raster-mode', default='LINES', choices=('LINES', 'COVERAGE'))
+    parser.add_argument('--strand-width', type=float, default=1)
+    parser.add_argument('--thread-widths', nargs='+', default=[], metavar='TYPE=WIDTH',
+                        help="pixel widths of the thread types in coverage textures, e.g. frame=3 hub=.5")
+    parser.add_argument('--atlas-layout', default='ATLAS', choices=('ATLAS', 'STRIP'))
+    parser.add_argument('--detail', default='FULL', choices=('FULL', 'PROXY'))
+    parser.add_argument('--scatter', type=float, default=0, metavar='SPACING', help="spread the webs over the candidates, their sites this far apart")
+    parser.add_argument('--curve-tolerance', type=float, default=0, help="largest distance between the threads and their curves, 0 for fixed resolutions")
+    parser.add_argument('--group-splines', action='store_true')
+    parser.add_argument('--workers', type=int, default=1, help="worker processes building the sets of the sweep, or the webs of a single set")
+    args = parser.parse_args(argv)
+    draw_curve = args.curves or not (args.meshes or args.texture_dir)
+    widths = {}
+    for pair in args.thread_widths:
+        name, _, width = pair.partition('=')
+        try:
+            widths[name] = float(width)
+        except ValueError:
+            parser.error("--thread-widths expects TYPE=WIDTH pairs, not %r" % pair)
+        if name not in THREAD_TYPES:
+            parser.error("unknown thread type %r, the types are %s" % (name, ", ".join(THREAD_TYPES)))
+
+    if args.grease_pencil:
+        bpy.context.scene.grease_pencil = bpy.data.grease_pencil[args.grease_pencil]
+    # the grease pencil is read once, the worker processes only get arrays
+    sources = [(os.path.splitext(os.path.basename(path))[0], read_points_file(path)) for path in args.points] or [("seed", points_array(get_grease_points()))]
+    first, count = args.seeds
+    jobs = [(name, points, sweep_seed) for name, points in sources for sweep_seed in range(first, first + count)]
+    settings = dict(size=args.size, webs_number=args.number, gravity_strength=args.gravity, density=args.density, detect_floor=not args.no_floor,
+                    randomness=args.randomness, group_splines=args.group_splines, detail=args.detail,
+                    curve_tolerance=args.curve_tolerance, scatter_spacing=args.scatter)
+
+    # with several sets, every worker builds whole sets and this process only draws them
+    pool = None
+    built_sets = [None] * len(jobs)
+    if args.workers > 1 and len(jobs) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        pool = multiprocessing.get_context('fork').Pool(min(args.workers, len(jobs)))
+        built_sets = pool.imap(build_web_set, [(points, sweep_seed, settings) for name, points, sweep_seed in jobs])
+
+    datablocks = set()
+    start = time.perf_counter()
+    try:
+        for k, ((name, points, sweep_seed), built) in enumerate(zip(jobs, built_sets)):
+            label = "%s_%d" % (name, sweep_seed)
+            texture_dir = os.path.join(os.path.abspath(args.texture_dir), label) if args.texture_dir else None
+            cache = None
+            if built is not None:
+                cache = StageCache(maxsize=len(built) + 1)
+                for key, web in built:
+                    cache[key] = web
+            before = set(bpy.context.scene.objects)
+            webs = Webs(draw_3d=args.meshes, draw_curve=draw_curve, draw_2d=bool(texture_dir), texture_size=args.texture_size,
+                        workers=1 if pool else args.workers, seed=sweep_seed, cache=cache, texture_dir=texture_dir,
+                        raster_mode=args.raster_mode, strand_width=args.strand_width, atlas_layout=args.atlas_layout, points=points,
+                        thread_widths=widths, **settings)
+            for obj in set(bpy.context.scene.objects) - before:
+                obj.name = "%s_%s" % (obj.name.split('.')[0], label)
+                obj.data.name = obj.name
+                datablocks.add(obj)
+            print("[%d/%d] %s: %d webs, %d verts, %d edges, %.2fs" % (k + 1, len(jobs), label, len(webs.webs), len(webs.verts),
+                                                                      len(webs.edges), time.perf_counter() - start))
+            sys.stdout.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    bpy.data.libraries.write(os.path.abspath(args.output), datablocks, fake_user=True)
+    print("%d objects written to %s" % (len(datablocks), args.output))
+
+
 if __name__ == "__main__":
-    register()
+    if '--' in sys.argv:
+        batch_main(sys.argv[sys.argv.index('--') + 1:])
+    else:
+        register()